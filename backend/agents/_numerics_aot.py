@@ -0,0 +1,38 @@
+"""
+Kernels numéricos del Trading Agent compilables por adelantado (AOT)
+
+Generar el módulo nativo ``agent_numerics`` junto a este archivo con:
+
+    python -m backend.agents._numerics_aot
+
+Requiere numba; si el módulo compilado no existe, el Trading Agent usa
+la versión @njit o la vectorizada con NumPy.
+"""
+
+import os
+
+import numpy as np
+
+# Nombre del módulo nativo generado y firma exportada del kernel de PnL
+AOT_MODULE_NAME = "agent_numerics"
+RECOMPUTE_PNL_SIGNATURE = "void(f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])"
+
+def recompute_pnl_loop(qty: np.ndarray, avg_price: np.ndarray, cost: np.ndarray, current_price: np.ndarray,
+                       out_pnl: np.ndarray, out_pct: np.ndarray):
+    """PnL no realizado y porcentaje sobre el costo (kernel compilado con numba)"""
+    for i in range(qty.size):
+        pnl = (current_price[i] - avg_price[i]) * qty[i]
+        out_pnl[i] = pnl
+        out_pct[i] = pnl / cost[i] * 100 if cost[i] > 0 else 0.0
+
+def build(output_dir: str = None):
+    """Compilar ``agent_numerics`` con numba.pycc"""
+    from numba.pycc import CC
+
+    cc = CC(AOT_MODULE_NAME)
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    cc.export("recompute_pnl", RECOMPUTE_PNL_SIGNATURE)(recompute_pnl_loop)
+    cc.compile()
+
+if __name__ == "__main__":
+    build()
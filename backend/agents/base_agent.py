@@ -137,10 +137,23 @@ class BaseAgent(ABC):
         Args:
             task: Tarea a ejecutar
         """
-        start_time = datetime.utcnow()
         self.current_task = task
         self.status = AgentStatus.WORKING
         
+        try:
+            await self._run_task(task)
+        finally:
+            self.current_task = None
+            self.status = AgentStatus.IDLE
+    
+    async def _run_task(self, task: AgentTask):
+        """
+        Procesar una tarea registrando estadísticas y actividad
+        
+        No toca current_task ni status; eso queda a cargo de quien la ejecuta.
+        """
+        start_time = datetime.utcnow()
+        
         try:
             self.logger.info(f"🔄 Ejecutando tarea {task.task_id} ({task.task_type})")
             
@@ -171,10 +184,6 @@ class BaseAgent(ABC):
             await self._log_activity(task, None, execution_time, "error", str(e))
             
             self.logger.error(f"❌ Error ejecutando tarea {task.task_id}: {e}")
-            
-        finally:
-            self.current_task = None
-            self.status = AgentStatus.IDLE
     
     async def _log_activity(self, task: AgentTask, result: Any, execution_time: float, 
                           status: str, error_message: str = None):
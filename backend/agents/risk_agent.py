@@ -3,16 +3,231 @@ Risk Agent - Agente especializado en gestión de riesgo
 """
 
 import asyncio
+import math
+import time
+from collections import deque, namedtuple
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import numpy as np
-import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:  # numba es opcional: la simulación usa la versión NumPy
+    njit = None
 
 from backend.agents.base_agent import BaseAgent, AgentTask
 from backend.services.binance_service import BinanceService
 from backend.core.database import DatabaseManager
 from backend.core.config import settings
 
+def _log_returns(df) -> np.ndarray:
+    """Retornos logarítmicos de la columna close como ndarray"""
+    closes = df['close'].to_numpy(dtype=np.float64)
+    return np.diff(np.log(closes))
+
+_last_iso_second: Optional[int] = None
+_last_iso = ""
+
+def _now_iso() -> str:
+    """Timestamp UTC en ISO con resolución de 1 segundo; solo se reformatea al cambiar el segundo"""
+    global _last_iso_second, _last_iso
+    second = int(time.time())
+    if second != _last_iso_second:
+        _last_iso = datetime.utcfromtimestamp(second).isoformat()
+        _last_iso_second = second
+    return _last_iso
+
+def _compute_corr(returns: np.ndarray) -> np.ndarray:
+    """Matriz de correlación de una matriz de retornos (T, N); NaN si una columna es constante"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.corrcoef(returns, rowvar=False)
+
+def _mean_and_cholesky(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Media y factor de Cholesky de la covarianza de una matriz de retornos (T, N)"""
+    mu = returns.mean(axis=0)
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    # Pequeño jitter en la diagonal para activos constantes o casi colineales
+    cov[np.diag_indices_from(cov)] += 1e-12
+    return mu, np.linalg.cholesky(cov)
+
+def _mc_scenarios_vectorized(z: np.ndarray, mu: np.ndarray, chol: np.ndarray,
+                             weights: np.ndarray, horizon: int) -> np.ndarray:
+    """Retorno simple del portafolio por escenario a partir de normales estándar (NumPy)"""
+    log_returns = mu * horizon + (z @ chol.T) * math.sqrt(horizon)
+    return np.expm1(log_returns) @ weights
+
+def _mc_scenarios_loop(z: np.ndarray, mu: np.ndarray, chol: np.ndarray,
+                       weights: np.ndarray, horizon: int) -> np.ndarray:
+    """Misma simulación escenario a escenario, sin matrices intermedias (para numba)"""
+    n_sims, n_assets = z.shape
+    scale = math.sqrt(horizon)
+    out = np.empty(n_sims)
+    for s in range(n_sims):
+        total = 0.0
+        for i in range(n_assets):
+            shock = 0.0
+            # chol es triangular inferior: sólo las columnas k <= i contribuyen
+            for k in range(i + 1):
+                shock += z[s, k] * chol[i, k]
+            total += weights[i] * math.expm1(mu[i] * horizon + shock * scale)
+        out[s] = total
+    return out
+
+if njit is not None:
+    # nogil: la simulación corre en asyncio.to_thread sin retener el GIL
+    _mc_scenarios = njit(cache=True, fastmath=True, nogil=True)(_mc_scenarios_loop)
+else:
+    _mc_scenarios = _mc_scenarios_vectorized
+
+def _mc_portfolio_returns(mu: np.ndarray, chol: np.ndarray, weights: np.ndarray,
+                          n_sims: int, horizon: int) -> np.ndarray:
+    """Simular retornos simples del portafolio a `horizon` días (normal multivariante)"""
+    z = np.random.default_rng().standard_normal((n_sims, mu.size))
+    return _mc_scenarios(z, mu, chol, weights, horizon)
+
+@dataclass(slots=True)
+class _PosView:
+    """Campos numéricos de una posición extraídos una sola vez del diccionario"""
+    price: float
+    qty: float
+    pnl: float
+    
+    @classmethod
+    def from_position(cls, position: Dict[str, Any]) -> "_PosView":
+        return cls(
+            position.get("current_price", 0.0),
+            position.get("quantity", 0.0),
+            position.get("unrealized_pnl", 0.0)
+        )
+    
+    @property
+    def value(self) -> float:
+        return self.price * self.qty
+
+@dataclass(slots=True)
+class RiskMetrics:
+    """Métricas de riesgo del portafolio calculadas en cada ciclo"""
+    max_position_concentration: float = 0.0
+    position_count: int = 0
+    average_position_size: float = 0.0
+    total_exposure: float = 0.0
+    cash_reserve: float = 0.0
+    unrealized_pnl_percentage: float = 0.0
+    estimated_portfolio_volatility: float = 0.0
+    current_drawdown: float = 0.0
+    error: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convertir a diccionario para callers externos / serialización"""
+        data = asdict(self)
+        if data["error"] is None:
+            del data["error"]
+        return data
+
+# Violación de un límite de riesgo (se convierte a dict con _asdict() al serializar)
+Violation = namedtuple("Violation", "type severity current_value limit message")
+
+def _iter_positions(positions: Dict[str, Any]) -> Iterator[Tuple[str, _PosView]]:
+    """Iterar posiciones activas (cantidad > 0) como vistas desempaquetadas"""
+    for symbol, position in positions.items():
+        view = _PosView.from_position(position)
+        if view.qty > 0:
+            yield symbol, view
+
+class _RollingReturns:
+    """
+    Ventana móvil de retornos logarítmicos diarios con sumas acumuladas
+    
+    La última vela (en curso) se mantiene aparte: su cierre se reemplaza en
+    cada actualización y solo entra en la ventana cuando aparece una vela nueva,
+    de modo que cada actualización es O(1).
+    """
+    __slots__ = ("closed_returns", "total", "total_sq", "last_closed_close", "live_timestamp", "live_close")
+    
+    def __init__(self, df, periods: int):
+        closes = df['close'].to_numpy(dtype=np.float64)
+        returns = _log_returns(df)[:-1]
+        # La ventana total (cerradas + vela en curso) tiene periods - 1 retornos
+        self.closed_returns = deque(returns, maxlen=max(periods - 2, 1))
+        self.total = float(np.sum(self.closed_returns))
+        self.total_sq = float(np.sum(np.square(self.closed_returns)))
+        self.last_closed_close = float(closes[-2]) if len(closes) > 1 else None
+        self.live_timestamp = df.index[-1]
+        self.live_close = float(closes[-1])
+    
+    def update(self, df) -> bool:
+        """
+        Incorporar velas recientes
+        
+        Returns:
+            False si hay un hueco respecto a la última vela conocida (requiere recarga)
+        """
+        if df.index[0] > self.live_timestamp:
+            return False
+        
+        for timestamp, close in zip(df.index, df['close'].to_numpy(dtype=np.float64)):
+            if timestamp < self.live_timestamp:
+                continue
+            if timestamp > self.live_timestamp:
+                # La vela en curso cerró: su retorno entra en la ventana
+                if self.last_closed_close is not None:
+                    self._push(math.log(self.live_close / self.last_closed_close))
+                self.last_closed_close = self.live_close
+                self.live_timestamp = timestamp
+            self.live_close = float(close)
+        return True
+    
+    def _push(self, value: float):
+        if len(self.closed_returns) == self.closed_returns.maxlen:
+            oldest = self.closed_returns[0]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+        self.closed_returns.append(value)
+        self.total += value
+        self.total_sq += value * value
+    
+    def _live_return(self) -> Optional[float]:
+        if self.last_closed_close is None:
+            return None
+        return math.log(self.live_close / self.last_closed_close)
+    
+    def returns(self) -> np.ndarray:
+        """Retornos de la ventana, del más antiguo a la vela en curso"""
+        live = self._live_return()
+        closed = np.fromiter(self.closed_returns, dtype=np.float64, count=len(self.closed_returns))
+        return closed if live is None else np.append(closed, live)
+    
+    def volatility(self) -> Optional[float]:
+        """Volatilidad anualizada (asumiendo 365 días) a partir de las sumas acumuladas"""
+        live = self._live_return()
+        n = len(self.closed_returns) + (live is not None)
+        if n < 2:
+            return None
+        
+        total = self.total + (live or 0.0)
+        total_sq = self.total_sq + (live or 0.0) ** 2
+        variance = max((total_sq - total * total / n) / (n - 1), 0.0)
+        return math.sqrt(variance) * math.sqrt(365)
+
+# Puntos de riesgo sumados por cada violación según su severidad
+_SEV_POINTS = {"CRITICAL": 25, "HIGH": 15, "MEDIUM": 10}
+
+# Tiempo de vida (segundos) de volatilidades y correlaciones cacheadas
+MARKET_STATS_CACHE_TTL = 300
+
+# Antigüedad máxima (segundos) de un precio cacheado para verificar trades
+PRICE_CACHE_MAX_AGE = 2.0
+
+# Velas pedidas en cada actualización incremental de las ventanas móviles
+ROLLING_REFRESH_BARS = 3
+
+# Máximo de requests concurrentes a Binance (límites de rate)
+MAX_CONCURRENT_FETCHES = 8
+
+# Simulaciones por defecto del VaR Monte Carlo
+MC_VAR_SIMULATIONS = 50_000
+
 class RiskAgent(BaseAgent):
     """
     Agente especializado en gestión de riesgo
@@ -25,6 +240,17 @@ class RiskAgent(BaseAgent):
     - Implementar reglas de gestión de capital
     """
     
+    # Tipo de tarea -> nombre del método que la procesa
+    _HANDLERS = {
+        "assess_portfolio_risk": "_assess_portfolio_risk",
+        "check_trade_risk": "_check_trade_risk",
+        "calculate_var": "_calculate_var",
+        "monitor_drawdown": "_monitor_drawdown",
+        "check_correlation_risk": "_check_correlation_risk",
+        "generate_risk_report": "_generate_risk_report",
+        "suggest_position_adjustments": "_suggest_position_adjustments"
+    }
+    
     def __init__(self):
         super().__init__(
             name="RiskAgent",
@@ -40,8 +266,29 @@ class RiskAgent(BaseAgent):
             "min_cash_reserve": 0.1  # 10% mínimo en efectivo
         }
         self.risk_metrics = {}
-        self.alerts = []
+        # Alertas en orden de llegada (timestamp datetime): las antiguas se descartan por la izquierda
+        self.alerts: deque = deque()
+        # Caches (timestamp monotónico, valor) para evitar fetches repetidos a Binance
+        self._vol_cache: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._rolling: Dict[Tuple[str, int], _RollingReturns] = {}
+        self._price_cache: Dict[str, Tuple[float, float]] = {}
+        self._chol_cache: Dict[Tuple[str, ...], Tuple[float, np.ndarray, np.ndarray]] = {}
+        self._fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        self._handlers = {task_type: getattr(self, name) for task_type, name in self._HANDLERS.items()}
         
+    @property
+    def risk_limits(self) -> Dict[str, Any]:
+        """Límites de riesgo activos"""
+        return self._risk_limits
+    
+    @risk_limits.setter
+    def risk_limits(self, limits: Dict[str, Any]):
+        """Reemplazar límites recalculando los umbrales en porcentaje (reasignar, no mutar en sitio)"""
+        self._risk_limits = limits
+        self._max_drawdown_pct = limits["max_drawdown"] * 100
+        self._max_daily_loss_pct = limits["max_daily_loss"] * 100
+        self._neg_max_daily_loss_pct = -self._max_daily_loss_pct
+    
     async def _initialize_agent(self):
         """Inicializar servicios del agente de riesgo"""
         self.binance_service = BinanceService()
@@ -51,32 +298,20 @@ class RiskAgent(BaseAgent):
     
     async def _process_task(self, task: AgentTask) -> Any:
         """Procesar tareas de gestión de riesgo"""
-        task_type = task.task_type
-        parameters = task.parameters
-        
-        if task_type == "assess_portfolio_risk":
-            return await self._assess_portfolio_risk(parameters)
-        elif task_type == "check_trade_risk":
-            return await self._check_trade_risk(parameters)
-        elif task_type == "calculate_var":
-            return await self._calculate_var(parameters)
-        elif task_type == "monitor_drawdown":
-            return await self._monitor_drawdown(parameters)
-        elif task_type == "check_correlation_risk":
-            return await self._check_correlation_risk(parameters)
-        elif task_type == "generate_risk_report":
-            return await self._generate_risk_report(parameters)
-        elif task_type == "suggest_position_adjustments":
-            return await self._suggest_position_adjustments(parameters)
-        else:
-            raise ValueError(f"Tipo de tarea no soportado: {task_type}")
-    
-    async def _assess_portfolio_risk(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        handler = self._handlers.get(task.task_type)
+        if handler is None:
+            raise ValueError(f"Tipo de tarea no soportado: {task.task_type}")
+        
+        return await handler(task.parameters)
+    
+    async def _assess_portfolio_risk(self, parameters: Dict[str, Any],
+                                     timestamp: Optional[str] = None) -> Dict[str, Any]:
         """
         Evaluar riesgo general del portafolio
         
         Args:
             parameters: Debe contener información del portafolio
+            timestamp: Timestamp ISO ya calculado por el llamador (opcional)
             
         Returns:
             Evaluación completa de riesgo
@@ -87,7 +322,7 @@ class RiskAgent(BaseAgent):
         
         try:
             risk_assessment = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": timestamp or _now_iso(),
                 "overall_risk_score": 0,
                 "risk_level": "LOW",
                 "metrics": {},
@@ -96,14 +331,15 @@ class RiskAgent(BaseAgent):
             }
             
             # Calcular métricas de riesgo
-            risk_assessment["metrics"] = await self._calculate_risk_metrics(portfolio)
+            metrics = await self._calculate_risk_metrics(portfolio)
+            risk_assessment["metrics"] = metrics.to_dict()
             
             # Verificar violaciones de límites
-            violations = await self._check_risk_violations(portfolio, risk_assessment["metrics"])
-            risk_assessment["violations"] = violations
+            violations = await self._check_risk_violations(portfolio, metrics)
+            risk_assessment["violations"] = [violation._asdict() for violation in violations]
             
             # Calcular score de riesgo general
-            risk_score = self._calculate_overall_risk_score(risk_assessment["metrics"], violations)
+            risk_score = self._calculate_overall_risk_score(metrics, violations)
             risk_assessment["overall_risk_score"] = risk_score
             
             # Determinar nivel de riesgo
@@ -117,9 +353,7 @@ class RiskAgent(BaseAgent):
                 risk_assessment["risk_level"] = "LOW"
             
             # Generar recomendaciones
-            risk_assessment["recommendations"] = self._generate_risk_recommendations(
-                risk_assessment["metrics"], violations
-            )
+            risk_assessment["recommendations"] = self._generate_risk_recommendations(metrics, violations)
             
             # Actualizar métricas internas
             self.risk_metrics = risk_assessment["metrics"]
@@ -130,207 +364,230 @@ class RiskAgent(BaseAgent):
             self.logger.error(f"Error evaluando riesgo del portafolio: {e}")
             raise
     
-    async def _calculate_risk_metrics(self, portfolio: Dict[str, Any]) -> Dict[str, Any]:
+    async def _calculate_risk_metrics(self, portfolio: Dict[str, Any]) -> RiskMetrics:
         """Calcular métricas de riesgo del portafolio"""
-        metrics = {}
+        metrics = RiskMetrics()
         
         try:
             positions = portfolio.get("active_positions", {})
             current_balance = portfolio.get("current_balance", 1000.0)
             total_portfolio_value = portfolio.get("total_portfolio_value", current_balance)
             
+            # Vista SoA de las posiciones (una sola pasada sobre el diccionario)
+            prices, quantities, pnls = self._positions_to_arrays(positions)
+            active = quantities > 0
+            position_values = prices[active] * quantities[active]
+            active_symbols = [symbol for symbol, is_active in zip(positions, active) if is_active]
+            
             # Concentración de posiciones
-            if positions:
-                position_values = []
-                for symbol, position in positions.items():
-                    if position.get("quantity", 0) > 0:
-                        position_value = position.get("current_price", 0) * position.get("quantity", 0)
-                        position_values.append(position_value)
-                
-                if position_values:
-                    max_position_value = max(position_values)
-                    metrics["max_position_concentration"] = max_position_value / total_portfolio_value
-                    metrics["position_count"] = len(position_values)
-                    metrics["average_position_size"] = np.mean(position_values) / total_portfolio_value
-                else:
-                    metrics["max_position_concentration"] = 0
-                    metrics["position_count"] = 0
-                    metrics["average_position_size"] = 0
-            else:
-                metrics["max_position_concentration"] = 0
-                metrics["position_count"] = 0
-                metrics["average_position_size"] = 0
+            if position_values.size:
+                metrics.max_position_concentration = float(position_values.max()) / total_portfolio_value
+                metrics.position_count = int(position_values.size)
+                metrics.average_position_size = float(position_values.mean()) / total_portfolio_value
             
             # Exposición total
-            total_position_value = sum(
-                pos.get("current_price", 0) * pos.get("quantity", 0) 
-                for pos in positions.values() 
-                if pos.get("quantity", 0) > 0
-            )
-            metrics["total_exposure"] = total_position_value / total_portfolio_value
-            metrics["cash_reserve"] = (current_balance - total_position_value) / total_portfolio_value
+            total_position_value = float(position_values.sum())
+            metrics.total_exposure = total_position_value / total_portfolio_value
+            metrics.cash_reserve = (current_balance - total_position_value) / total_portfolio_value
             
             # PnL no realizado como porcentaje
-            total_unrealized_pnl = sum(
-                pos.get("unrealized_pnl", 0) for pos in positions.values()
-            )
-            metrics["unrealized_pnl_percentage"] = (total_unrealized_pnl / 1000.0) * 100  # Asumiendo capital inicial de 1000
+            total_unrealized_pnl = float(pnls.sum())
+            metrics.unrealized_pnl_percentage = (total_unrealized_pnl / 1000.0) * 100  # Asumiendo capital inicial de 1000
             
             # Volatilidad del portafolio (estimación simple)
-            if positions:
-                volatilities = []
-                for symbol in positions.keys():
-                    vol = await self._estimate_asset_volatility(symbol)
-                    if vol:
-                        volatilities.append(vol)
+            # Solo posiciones con cantidad > 0: las vacías no necesitan datos de mercado
+            self._sync_rolling_symbols(active_symbols)
+            if active_symbols:
+                volatilities = await asyncio.gather(
+                    *(self._estimate_asset_volatility(symbol) for symbol in active_symbols)
+                )
+                volatilities = [vol for vol in volatilities if vol]
                 
                 if volatilities:
-                    metrics["estimated_portfolio_volatility"] = np.mean(volatilities)
-                else:
-                    metrics["estimated_portfolio_volatility"] = 0
-            else:
-                metrics["estimated_portfolio_volatility"] = 0
+                    metrics.estimated_portfolio_volatility = float(np.mean(volatilities))
             
             # Drawdown actual
-            metrics["current_drawdown"] = max(0, -metrics["unrealized_pnl_percentage"])
+            metrics.current_drawdown = max(0, -metrics.unrealized_pnl_percentage)
             
         except Exception as e:
             self.logger.error(f"Error calculando métricas de riesgo: {e}")
-            metrics["error"] = str(e)
+            metrics.error = str(e)
         
         return metrics
     
+    @staticmethod
+    def _positions_to_arrays(positions: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Convertir posiciones a arrays paralelos (precios, cantidades, PnL) en una sola pasada"""
+        rows = np.array(
+            [
+                (pos.get("current_price", 0), pos.get("quantity", 0), pos.get("unrealized_pnl", 0))
+                for pos in positions.values()
+            ],
+            dtype=np.float64
+        ).reshape(-1, 3)
+        return rows[:, 0], rows[:, 1], rows[:, 2]
+    
+    async def _fetch_daily_klines(self, symbol: str, periods: int):
+        """Obtener velas diarias respetando el límite de requests concurrentes"""
+        async with self._fetch_semaphore:
+            return await self.binance_service.get_historical_data(symbol, "1d", periods)
+    
+    async def _get_rolling_returns(self, symbol: str, periods: int = 30) -> Optional[_RollingReturns]:
+        """Obtener la ventana móvil de un símbolo, descargando solo las velas nuevas"""
+        key = (symbol, periods)
+        window = self._rolling.get(key)
+        
+        if window is not None:
+            df = await self._fetch_daily_klines(symbol, ROLLING_REFRESH_BARS)
+            if not df.empty and window.update(df):
+                return window
+        
+        # Primera carga o hueco en los datos: recargar la ventana completa
+        df = await self._fetch_daily_klines(symbol, periods)
+        if df.empty:
+            self._rolling.pop(key, None)
+            return None
+        
+        # Pocas decenas de filas: calcular en línea es más barato que saltar a un hilo
+        window = _RollingReturns(df, periods)
+        self._rolling[key] = window
+        return window
+    
+    def _sync_rolling_symbols(self, symbols):
+        """Descartar ventanas móviles de símbolos que ya no están en el portafolio"""
+        symbols = set(symbols)
+        for key in [key for key in self._rolling if key[0] not in symbols]:
+            del self._rolling[key]
+    
     async def _estimate_asset_volatility(self, symbol: str, periods: int = 30) -> Optional[float]:
         """Estimar volatilidad de un activo"""
+        key = (symbol, periods)
+        now = time.monotonic()
+        cached = self._vol_cache.get(key)
+        if cached and now - cached[0] < MARKET_STATS_CACHE_TTL:
+            return cached[1]
+        
         try:
-            df = await self.binance_service.get_historical_data(symbol, "1d", periods)
-            if df.empty:
+            window = await self._get_rolling_returns(symbol, periods)
+            if window is None:
                 return None
             
-            # Calcular retornos diarios
-            returns = df['close'].pct_change().dropna()
+            # Volatilidad anualizada a partir de la ventana móvil
+            volatility = window.volatility()
+            if volatility is None:
+                return None
             
-            # Volatilidad anualizada (asumiendo 365 días)
-            volatility = returns.std() * np.sqrt(365)
+            self._vol_cache[key] = (now, volatility)
             
-            return float(volatility)
+            return volatility
             
         except Exception as e:
             self.logger.error(f"Error estimando volatilidad de {symbol}: {e}")
             return None
     
-    async def _check_risk_violations(self, portfolio: Dict[str, Any], metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _check_risk_violations(self, portfolio: Dict[str, Any], metrics: RiskMetrics) -> List[Violation]:
         """Verificar violaciones de límites de riesgo"""
         violations = []
         
         try:
             # Verificar concentración máxima de posición
-            max_concentration = metrics.get("max_position_concentration", 0)
+            max_concentration = metrics.max_position_concentration
             if max_concentration > self.risk_limits["max_position_size"]:
-                violations.append({
-                    "type": "position_concentration",
-                    "severity": "HIGH",
-                    "current_value": max_concentration,
-                    "limit": self.risk_limits["max_position_size"],
-                    "message": f"Concentración de posición excede el límite: {max_concentration:.2%} > {self.risk_limits['max_position_size']:.2%}"
-                })
+                violations.append(Violation(
+                    type="position_concentration",
+                    severity="HIGH",
+                    current_value=max_concentration,
+                    limit=self.risk_limits["max_position_size"],
+                    message=f"Concentración de posición excede el límite: {max_concentration:.2%} > {self.risk_limits['max_position_size']:.2%}"
+                ))
             
             # Verificar drawdown máximo
-            current_drawdown = metrics.get("current_drawdown", 0)
-            if current_drawdown > self.risk_limits["max_drawdown"] * 100:
-                violations.append({
-                    "type": "max_drawdown",
-                    "severity": "CRITICAL",
-                    "current_value": current_drawdown,
-                    "limit": self.risk_limits["max_drawdown"] * 100,
-                    "message": f"Drawdown excede el límite: {current_drawdown:.2f}% > {self.risk_limits['max_drawdown']*100:.2f}%"
-                })
+            current_drawdown = metrics.current_drawdown
+            if current_drawdown > self._max_drawdown_pct:
+                violations.append(Violation(
+                    type="max_drawdown",
+                    severity="CRITICAL",
+                    current_value=current_drawdown,
+                    limit=self._max_drawdown_pct,
+                    message=f"Drawdown excede el límite: {current_drawdown:.2f}% > {self._max_drawdown_pct:.2f}%"
+                ))
             
             # Verificar reserva mínima de efectivo
-            cash_reserve = metrics.get("cash_reserve", 0)
+            cash_reserve = metrics.cash_reserve
             if cash_reserve < self.risk_limits["min_cash_reserve"]:
-                violations.append({
-                    "type": "cash_reserve",
-                    "severity": "MEDIUM",
-                    "current_value": cash_reserve,
-                    "limit": self.risk_limits["min_cash_reserve"],
-                    "message": f"Reserva de efectivo por debajo del mínimo: {cash_reserve:.2%} < {self.risk_limits['min_cash_reserve']:.2%}"
-                })
+                violations.append(Violation(
+                    type="cash_reserve",
+                    severity="MEDIUM",
+                    current_value=cash_reserve,
+                    limit=self.risk_limits["min_cash_reserve"],
+                    message=f"Reserva de efectivo por debajo del mínimo: {cash_reserve:.2%} < {self.risk_limits['min_cash_reserve']:.2%}"
+                ))
             
             # Verificar pérdida diaria
-            unrealized_pnl_pct = metrics.get("unrealized_pnl_percentage", 0)
-            if unrealized_pnl_pct < -self.risk_limits["max_daily_loss"] * 100:
-                violations.append({
-                    "type": "daily_loss",
-                    "severity": "HIGH",
-                    "current_value": unrealized_pnl_pct,
-                    "limit": -self.risk_limits["max_daily_loss"] * 100,
-                    "message": f"Pérdida diaria excede el límite: {unrealized_pnl_pct:.2f}% < {-self.risk_limits['max_daily_loss']*100:.2f}%"
-                })
+            unrealized_pnl_pct = metrics.unrealized_pnl_percentage
+            if unrealized_pnl_pct < self._neg_max_daily_loss_pct:
+                violations.append(Violation(
+                    type="daily_loss",
+                    severity="HIGH",
+                    current_value=unrealized_pnl_pct,
+                    limit=self._neg_max_daily_loss_pct,
+                    message=f"Pérdida diaria excede el límite: {unrealized_pnl_pct:.2f}% < {self._neg_max_daily_loss_pct:.2f}%"
+                ))
             
         except Exception as e:
             self.logger.error(f"Error verificando violaciones de riesgo: {e}")
-            violations.append({
-                "type": "error",
-                "severity": "HIGH",
-                "message": f"Error verificando riesgo: {str(e)}"
-            })
+            violations.append(Violation(
+                type="error",
+                severity="HIGH",
+                current_value=None,
+                limit=None,
+                message=f"Error verificando riesgo: {str(e)}"
+            ))
         
         return violations
     
-    def _calculate_overall_risk_score(self, metrics: Dict[str, Any], violations: List[Dict[str, Any]]) -> int:
+    def _calculate_overall_risk_score(self, metrics: RiskMetrics, violations: List[Violation]) -> int:
         """Calcular score general de riesgo (0-100)"""
         score = 0
         
         # Score base por métricas
-        max_concentration = metrics.get("max_position_concentration", 0)
-        score += min(max_concentration * 100, 30)  # Máximo 30 puntos por concentración
+        score += min(metrics.max_position_concentration * 100, 30)  # Máximo 30 puntos por concentración
         
-        total_exposure = metrics.get("total_exposure", 0)
-        score += min(total_exposure * 20, 20)  # Máximo 20 puntos por exposición
+        score += min(metrics.total_exposure * 20, 20)  # Máximo 20 puntos por exposición
         
-        volatility = metrics.get("estimated_portfolio_volatility", 0)
-        score += min(volatility * 100, 20)  # Máximo 20 puntos por volatilidad
+        score += min(metrics.estimated_portfolio_volatility * 100, 20)  # Máximo 20 puntos por volatilidad
         
         # Penalización por violaciones
-        for violation in violations:
-            if violation["severity"] == "CRITICAL":
-                score += 25
-            elif violation["severity"] == "HIGH":
-                score += 15
-            elif violation["severity"] == "MEDIUM":
-                score += 10
+        score += sum(_SEV_POINTS.get(violation.severity, 0) for violation in violations)
         
         return min(int(score), 100)
     
-    def _generate_risk_recommendations(self, metrics: Dict[str, Any], violations: List[Dict[str, Any]]) -> List[str]:
+    def _generate_risk_recommendations(self, metrics: RiskMetrics, violations: List[Violation]) -> List[str]:
         """Generar recomendaciones para reducir riesgo"""
         recommendations = []
         
         # Recomendaciones basadas en violaciones
         for violation in violations:
-            if violation["type"] == "position_concentration":
+            if violation.type == "position_concentration":
                 recommendations.append("Reducir el tamaño de la posición más grande para mejorar diversificación")
-            elif violation["type"] == "max_drawdown":
+            elif violation.type == "max_drawdown":
                 recommendations.append("URGENTE: Cerrar posiciones perdedoras para limitar drawdown")
-            elif violation["type"] == "cash_reserve":
+            elif violation.type == "cash_reserve":
                 recommendations.append("Aumentar reserva de efectivo cerrando algunas posiciones")
-            elif violation["type"] == "daily_loss":
+            elif violation.type == "daily_loss":
                 recommendations.append("Considerar cerrar posiciones para limitar pérdidas diarias")
         
         # Recomendaciones generales
-        max_concentration = metrics.get("max_position_concentration", 0)
-        if max_concentration > 0.3:  # 30%
+        if metrics.max_position_concentration > 0.3:  # 30%
             recommendations.append("Considerar diversificar más el portafolio")
         
-        position_count = metrics.get("position_count", 0)
+        position_count = metrics.position_count
         if position_count > 10:
             recommendations.append("Considerar consolidar posiciones para mejor gestión")
         elif position_count < 3 and position_count > 0:
             recommendations.append("Considerar diversificar en más activos")
         
-        volatility = metrics.get("estimated_portfolio_volatility", 0)
-        if volatility > 0.5:  # 50% volatilidad anual
+        if metrics.estimated_portfolio_volatility > 0.5:  # 50% volatilidad anual
             recommendations.append("Portafolio con alta volatilidad - considerar activos menos volátiles")
         
         if not recommendations:
@@ -356,8 +613,14 @@ class RiskAgent(BaseAgent):
                 "reason": ""
             }
             
-            # Obtener precio actual
-            current_price = await self.binance_service.get_current_price(symbol)
+            # Validaciones baratas antes de cualquier llamada de red
+            if not symbol or not quantity or float(quantity) <= 0:
+                risk_check["approved"] = False
+                risk_check["reason"] = "Parámetros de trade inválidos"
+                return risk_check
+            
+            # Obtener precio actual (cache reciente o Binance)
+            current_price = await self._get_price(symbol)
             if not current_price:
                 risk_check["approved"] = False
                 risk_check["reason"] = "No se pudo obtener precio actual"
@@ -375,7 +638,7 @@ class RiskAgent(BaseAgent):
             
             # Verificar concentración después del trade
             if symbol in active_positions:
-                current_position_value = active_positions[symbol].get("current_price", 0) * active_positions[symbol].get("quantity", 0)
+                current_position_value = _PosView.from_position(active_positions[symbol]).value
                 new_position_value = current_position_value + (trade_value if side == "BUY" else -trade_value)
                 new_concentration = new_position_value / current_balance
                 
@@ -412,11 +675,24 @@ class RiskAgent(BaseAgent):
                 "reason": f"Error en verificación de riesgo: {str(e)}"
             }
     
+    async def _get_price(self, symbol: str, max_age: float = PRICE_CACHE_MAX_AGE) -> Optional[float]:
+        """Obtener precio actual, reutilizando el último precio si es suficientemente reciente"""
+        now = time.monotonic()
+        cached = self._price_cache.get(symbol)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+        
+        price = await self.binance_service.get_current_price(symbol)
+        if price:
+            self._price_cache[symbol] = (now, price)
+        return price
+    
     async def _calculate_var(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Calcular Value at Risk del portafolio"""
         portfolio = parameters.get("portfolio", {})
         confidence_level = parameters.get("confidence_level", 0.95)
         time_horizon = parameters.get("time_horizon", 1)  # días
+        method = parameters.get("method", "historical")  # "historical" | "monte_carlo"
         
         try:
             positions = portfolio.get("active_positions", {})
@@ -429,45 +705,60 @@ class RiskAgent(BaseAgent):
                     "message": "No hay posiciones activas"
                 }
             
-            # Método simplificado: usar volatilidad histórica
-            portfolio_value = 0
-            weighted_volatility = 0
+            # Simulación histórica sobre los retornos diarios de las ventanas móviles
+            values_by_symbol = {symbol: pos.value for symbol, pos in _iter_positions(positions)}
+            portfolio_value = float(sum(values_by_symbol.values()))
             
-            for symbol, position in positions.items():
-                if position.get("quantity", 0) > 0:
-                    position_value = position.get("current_price", 0) * position.get("quantity", 0)
-                    portfolio_value += position_value
-                    
-                    volatility = await self._estimate_asset_volatility(symbol)
-                    if volatility:
-                        weight = position_value / portfolio_value if portfolio_value > 0 else 0
-                        weighted_volatility += weight * volatility
-            
-            # Calcular VaR usando distribución normal
-            # VaR = Portfolio Value * Z-score * Volatility * sqrt(time_horizon)
-            if confidence_level == 0.95:
-                z_score = 1.645
-            elif confidence_level == 0.99:
-                z_score = 2.326
-            else:
-                z_score = 1.645  # Default
+            valid_symbols, returns = await self._fetch_return_matrix(list(values_by_symbol))
             
-            var = portfolio_value * z_score * weighted_volatility * np.sqrt(time_horizon)
+            var_pct = 0.0
+            portfolio_volatility = 0.0
+            if portfolio_value > 0 and returns.shape[0] >= 2:
+                weights = np.array([values_by_symbol[symbol] for symbol in valid_symbols]) / portfolio_value
+                # Retornos simples del portafolio (los activos sin datos no aportan riesgo)
+                pnl = np.expm1(returns) @ weights
+                portfolio_volatility = float(np.std(pnl, ddof=1) * np.sqrt(365))
+                
+                if method == "monte_carlo":
+                    mu, chol = self._portfolio_cholesky(valid_symbols, returns)
+                    n_sims = parameters.get("n_sims", MC_VAR_SIMULATIONS)
+                    simulated = await asyncio.to_thread(
+                        _mc_portfolio_returns, mu, chol, weights, n_sims, time_horizon
+                    )
+                    var_pct = max(0.0, float(-np.quantile(simulated, 1 - confidence_level)))
+                else:
+                    var_pct = max(0.0, float(-np.quantile(pnl, 1 - confidence_level) * np.sqrt(time_horizon)))
+            
+            var = var_pct * portfolio_value
             
             return {
                 "var": float(var),
-                "var_percentage": (var / portfolio_value * 100) if portfolio_value > 0 else 0,
+                "var_percentage": var_pct * 100,
                 "confidence_level": confidence_level,
                 "time_horizon": time_horizon,
+                "method": method,
                 "portfolio_value": portfolio_value,
-                "estimated_volatility": weighted_volatility
+                "estimated_volatility": portfolio_volatility
             }
             
         except Exception as e:
             self.logger.error(f"Error calculando VaR: {e}")
             return {"error": str(e)}
     
-    async def _monitor_drawdown(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    def _portfolio_cholesky(self, symbols: List[str], returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Media y Cholesky de la covarianza de los símbolos, cacheados entre llamadas"""
+        key = tuple(symbols)
+        now = time.monotonic()
+        cached = self._chol_cache.get(key)
+        if cached and now - cached[0] < MARKET_STATS_CACHE_TTL:
+            return cached[1], cached[2]
+        
+        mu, chol = _mean_and_cholesky(returns)
+        self._chol_cache[key] = (now, mu, chol)
+        return mu, chol
+    
+    async def _monitor_drawdown(self, parameters: Dict[str, Any],
+                                timestamp: Optional[str] = None) -> Dict[str, Any]:
         """Monitorear drawdown del portafolio"""
         try:
             # Obtener historial de performance (simplificado)
@@ -486,15 +777,15 @@ class RiskAgent(BaseAgent):
             
             result = {
                 "current_drawdown": drawdown_percentage,
-                "max_allowed_drawdown": self.risk_limits["max_drawdown"] * 100,
+                "max_allowed_drawdown": self._max_drawdown_pct,
                 "exceeds_limit": exceeds_limit,
                 "current_value": current_value,
                 "peak_value": peak_value,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or _now_iso()
             }
             
             if exceeds_limit:
-                result["alert"] = f"ALERTA: Drawdown excede límite ({drawdown_percentage:.2f}% > {self.risk_limits['max_drawdown']*100:.2f}%)"
+                result["alert"] = f"ALERTA: Drawdown excede límite ({drawdown_percentage:.2f}% > {self._max_drawdown_pct:.2f}%)"
             
             return result
             
@@ -514,21 +805,27 @@ class RiskAgent(BaseAgent):
             correlations = {}
             high_correlations = []
             
-            for i, symbol1 in enumerate(symbols):
-                for j, symbol2 in enumerate(symbols[i+1:], i+1):
-                    # Calcular correlación entre pares (implementación simplificada)
-                    correlation = await self._calculate_pair_correlation(symbol1, symbol2)
+            # Una descarga por símbolo y una sola matriz de correlación para todos los pares
+            valid_symbols, returns = await self._fetch_return_matrix(symbols)
+            
+            if len(valid_symbols) >= 2 and returns.shape[0] >= 2:
+                correlation_matrix = _compute_corr(returns)
+                
+                rows, cols = np.triu_indices(len(valid_symbols), 1)
+                for i, j, correlation in zip(rows, cols, correlation_matrix[rows, cols]):
+                    if np.isnan(correlation):
+                        continue
+                    
+                    correlation = float(correlation)
+                    pair = f"{valid_symbols[i]}-{valid_symbols[j]}"
+                    correlations[pair] = correlation
                     
-                    if correlation is not None:
-                        pair = f"{symbol1}-{symbol2}"
-                        correlations[pair] = correlation
-                        
-                        if abs(correlation) > self.risk_limits["max_correlation_exposure"]:
-                            high_correlations.append({
-                                "pair": pair,
-                                "correlation": correlation,
-                                "risk_level": "HIGH" if abs(correlation) > 0.8 else "MEDIUM"
-                            })
+                    if abs(correlation) > self.risk_limits["max_correlation_exposure"]:
+                        high_correlations.append({
+                            "pair": pair,
+                            "correlation": correlation,
+                            "risk_level": "HIGH" if abs(correlation) > 0.8 else "MEDIUM"
+                        })
             
             return {
                 "correlations": correlations,
@@ -541,56 +838,67 @@ class RiskAgent(BaseAgent):
             self.logger.error(f"Error verificando correlaciones: {e}")
             return {"error": str(e)}
     
-    async def _calculate_pair_correlation(self, symbol1: str, symbol2: str, periods: int = 30) -> Optional[float]:
-        """Calcular correlación entre dos activos"""
-        try:
-            df1 = await self.binance_service.get_historical_data(symbol1, "1d", periods)
-            df2 = await self.binance_service.get_historical_data(symbol2, "1d", periods)
-            
-            if df1.empty or df2.empty:
-                return None
-            
-            # Calcular retornos
-            returns1 = df1['close'].pct_change().dropna()
-            returns2 = df2['close'].pct_change().dropna()
-            
-            # Alinear fechas
-            min_length = min(len(returns1), len(returns2))
-            returns1 = returns1.tail(min_length)
-            returns2 = returns2.tail(min_length)
-            
-            # Calcular correlación
-            correlation = returns1.corr(returns2)
-            
-            return float(correlation) if not np.isnan(correlation) else None
-            
-        except Exception as e:
-            self.logger.error(f"Error calculando correlación {symbol1}-{symbol2}: {e}")
-            return None
+    async def _fetch_return_matrix(self, symbols: List[str], periods: int = 30) -> Tuple[List[str], np.ndarray]:
+        """
+        Obtener matriz de retornos diarios alineada por las velas más recientes
+        
+        Returns:
+            Símbolos con datos y matriz de retornos de forma (T, N)
+        """
+        windows = await asyncio.gather(
+            *(self._get_rolling_returns(symbol, periods) for symbol in symbols)
+        )
+        
+        valid_symbols = []
+        columns = []
+        for symbol, window in zip(symbols, windows):
+            if window is None:
+                continue
+            valid_symbols.append(symbol)
+            columns.append(window.returns())
+        
+        if not columns:
+            return [], np.empty((0, 0))
+        
+        # Alinear fechas recortando al historial común más corto
+        length = min(len(column) for column in columns)
+        returns = np.column_stack([column[len(column) - length:] for column in columns])
+        return valid_symbols, returns
     
     async def _generate_risk_report(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Generar reporte completo de riesgo"""
         try:
             portfolio = parameters.get("portfolio", {})
-            
-            # Evaluar riesgo del portafolio
-            portfolio_risk = await self._assess_portfolio_risk({"portfolio": portfolio})
-            
-            # Calcular VaR
-            var_analysis = await self._calculate_var({"portfolio": portfolio})
-            
-            # Monitorear drawdown
-            drawdown_analysis = await self._monitor_drawdown({
+            positions = portfolio.get("active_positions", {})
+            symbols = list(positions.keys())
+            now_iso = _now_iso()
+            drawdown_parameters = {
                 "current_pnl": portfolio.get("total_unrealized_pnl", 0),
                 "initial_capital": 1000.0
-            })
+            }
             
-            # Verificar correlaciones
-            symbols = list(portfolio.get("active_positions", {}).keys())
-            correlation_analysis = await self._check_correlation_risk({"symbols": symbols})
+            if any(pos.get("quantity", 0) > 0 for pos in positions.values()):
+                # Riesgo, VaR, drawdown y correlaciones son independientes: ejecutarlos concurrentemente
+                portfolio_risk, var_analysis, drawdown_analysis, correlation_analysis = await asyncio.gather(
+                    self._assess_portfolio_risk({"portfolio": portfolio}, timestamp=now_iso),
+                    self._calculate_var({"portfolio": portfolio}),
+                    self._monitor_drawdown(drawdown_parameters, timestamp=now_iso),
+                    self._check_correlation_risk({"symbols": symbols})
+                )
+            else:
+                # Portafolio sin posiciones: VaR y correlaciones son triviales, sin consultas a Binance
+                portfolio_risk = await self._assess_portfolio_risk({"portfolio": portfolio}, timestamp=now_iso)
+                drawdown_analysis = await self._monitor_drawdown(drawdown_parameters, timestamp=now_iso)
+                var_analysis = {
+                    "var": 0,
+                    "confidence_level": 0.95,
+                    "time_horizon": 1,
+                    "message": "No hay posiciones activas"
+                }
+                correlation_analysis = {"message": "No hay posiciones activas"}
             
             risk_report = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": now_iso,
                 "portfolio_risk": portfolio_risk,
                 "var_analysis": var_analysis,
                 "drawdown_analysis": drawdown_analysis,
@@ -613,61 +921,67 @@ class RiskAgent(BaseAgent):
         """Sugerir ajustes de posición para reducir riesgo"""
         portfolio = parameters.get("portfolio", {})
         target_risk_level = parameters.get("target_risk_level", "MEDIUM")
+        max_suggestions = parameters.get("max_suggestions")  # None = todas
         
         try:
-            positions = portfolio.get("active_positions", {})
             suggestions = []
-            
-            # Evaluar cada posición
-            for symbol, position in positions.items():
-                if position.get("quantity", 0) > 0:
-                    position_value = position.get("current_price", 0) * position.get("quantity", 0)
-                    portfolio_value = portfolio.get("total_portfolio_value", 1000.0)
-                    concentration = position_value / portfolio_value
-                    
-                    # Sugerir reducción si concentración es alta
-                    if concentration > self.risk_limits["max_position_size"]:
-                        reduction_needed = concentration - self.risk_limits["max_position_size"]
-                        quantity_to_reduce = (reduction_needed * portfolio_value) / position.get("current_price", 1)
-                        
-                        suggestions.append({
-                            "symbol": symbol,
-                            "action": "REDUCE",
-                            "current_concentration": concentration,
-                            "target_concentration": self.risk_limits["max_position_size"],
-                            "quantity_to_reduce": quantity_to_reduce,
-                            "reason": "Concentración excede límite de riesgo"
-                        })
-                    
-                    # Sugerir cierre si hay pérdidas significativas
-                    unrealized_pnl = position.get("unrealized_pnl", 0)
-                    if unrealized_pnl < -position_value * 0.1:  # Pérdida > 10%
-                        suggestions.append({
-                            "symbol": symbol,
-                            "action": "CLOSE",
-                            "current_pnl": unrealized_pnl,
-                            "pnl_percentage": (unrealized_pnl / position_value) * 100,
-                            "reason": "Pérdida significativa - considerar cerrar posición"
-                        })
+            for suggestion in self._iter_suggestions(portfolio):
+                suggestions.append(suggestion)
+                if max_suggestions is not None and len(suggestions) >= max_suggestions:
+                    break
             
             return {
                 "suggestions": suggestions,
                 "total_suggestions": len(suggestions),
                 "priority_actions": [s for s in suggestions if s["action"] == "CLOSE"],
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": _now_iso()
             }
             
         except Exception as e:
             self.logger.error(f"Error sugiriendo ajustes: {e}")
             return {"error": str(e)}
     
+    def _iter_suggestions(self, portfolio: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Generar sugerencias de ajuste posición a posición, bajo demanda"""
+        positions = portfolio.get("active_positions", {})
+        portfolio_value = portfolio.get("total_portfolio_value", 1000.0)
+        
+        # Evaluar cada posición
+        for symbol, position in _iter_positions(positions):
+            position_value = position.value
+            concentration = position_value / portfolio_value
+            
+            # Sugerir reducción si concentración es alta
+            if concentration > self.risk_limits["max_position_size"]:
+                reduction_needed = concentration - self.risk_limits["max_position_size"]
+                quantity_to_reduce = (reduction_needed * portfolio_value) / (position.price or 1)
+                
+                yield {
+                    "symbol": symbol,
+                    "action": "REDUCE",
+                    "current_concentration": concentration,
+                    "target_concentration": self.risk_limits["max_position_size"],
+                    "quantity_to_reduce": quantity_to_reduce,
+                    "reason": "Concentración excede límite de riesgo"
+                }
+            
+            # Sugerir cierre si hay pérdidas significativas
+            if position.pnl < -position_value * 0.1:  # Pérdida > 10%
+                yield {
+                    "symbol": symbol,
+                    "action": "CLOSE",
+                    "current_pnl": position.pnl,
+                    "pnl_percentage": (position.pnl / position_value) * 100,
+                    "reason": "Pérdida significativa - considerar cerrar posición"
+                }
+    
     async def _periodic_tasks(self):
         """Tareas periódicas del agente de riesgo"""
-        # Limpiar alertas antiguas
+        # Limpiar alertas antiguas (más de 1 hora)
         current_time = datetime.utcnow()
-        self.alerts = [
-            alert for alert in self.alerts 
-            if (current_time - alert.get("timestamp", current_time)).total_seconds() < 3600  # 1 hora
-        ]
+        cutoff = current_time - timedelta(seconds=3600)
+        alerts = self.alerts
+        while alerts and alerts[0].get("timestamp", current_time) <= cutoff:
+            alerts.popleft()
         
         await asyncio.sleep(0.1)
\ No newline at end of file
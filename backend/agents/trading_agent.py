@@ -3,17 +3,247 @@ Trading Agent - Agente especializado en ejecución de operaciones de trading
 """
 
 import asyncio
+import itertools
+import math
+import secrets
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from decimal import Decimal, ROUND_DOWN
-import uuid
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba es opcional: se usan las versiones Python/NumPy
+    njit = None
 
 from backend.agents.base_agent import BaseAgent, AgentTask
+from backend.agents._numerics_aot import recompute_pnl_loop as _recompute_pnl_loop
 from backend.services.binance_service import BinanceService
 from backend.services.risk_manager import RiskManager
 from backend.core.database import DatabaseManager
 from backend.core.config import settings
 
+# Máximo de trades por INSERT y ventana (segundos) para agruparlos
+TRADE_WRITE_BATCH_SIZE = 128
+TRADE_WRITE_BATCH_TIMEOUT = 0.05
+
+# Bytes aleatorios del prefijo de trade_id por sesión (trade_id es único en BD)
+TRADE_ID_PREFIX_BYTES = 8
+
+# Antigüedad máxima (segundos) del balance USDT cacheado
+BALANCE_CACHE_TTL = 0.5
+
+# Intervalos mínimos (segundos) entre consultas periódicas a Binance
+POSITIONS_CHECK_INTERVAL = 60.0
+PENDING_ORDERS_CHECK_INTERVAL = 5.0
+
+def _apply_buy(qty: np.ndarray, avg_price: np.ndarray, cost: np.ndarray,
+               idx: int, quantity: float, price: float):
+    """Aumentar posición recalculando el precio promedio"""
+    new_total_cost = cost[idx] + quantity * price
+    new_quantity = qty[idx] + quantity
+    avg_price[idx] = new_total_cost / new_quantity if new_quantity > 0 else 0.0
+    qty[idx] = new_quantity
+    cost[idx] = new_total_cost
+
+def _apply_sell(qty: np.ndarray, avg_price: np.ndarray, cost: np.ndarray, idx: int, quantity: float):
+    """Reducir posición; si llega a 0 la posición queda cerrada"""
+    qty[idx] -= quantity
+    if qty[idx] <= 0:
+        qty[idx] = 0.0
+        avg_price[idx] = 0.0
+        cost[idx] = 0.0
+
+def _recompute_pnl_vectorized(qty: np.ndarray, avg_price: np.ndarray, cost: np.ndarray, current_price: np.ndarray,
+                              out_pnl: np.ndarray, out_pct: np.ndarray):
+    """PnL no realizado y porcentaje sobre el costo (NumPy, sin numba)"""
+    np.multiply(current_price - avg_price, qty, out=out_pnl)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out_pct[:] = np.where(cost > 0, out_pnl / cost * 100, 0.0)
+
+try:
+    # Kernel precompilado (ver _numerics_aot): evita el JIT en el primer tick
+    from backend.agents.agent_numerics import recompute_pnl as _recompute_pnl_aot
+except ImportError:
+    _recompute_pnl_aot = None
+
+if njit is not None:
+    # Sin fastmath en el PnL: current_price usa NaN para posiciones sin valorar
+    _apply_buy = njit(cache=True, fastmath=True)(_apply_buy)
+    _apply_sell = njit(cache=True)(_apply_sell)
+    _recompute_pnl = _recompute_pnl_aot or njit(cache=True)(_recompute_pnl_loop)
+else:
+    _recompute_pnl = _recompute_pnl_aot or _recompute_pnl_vectorized
+
+@dataclass(slots=True)
+class OrderFill:
+    """Resultado de una orden con los campos numéricos ya normalizados"""
+    order_id: Any
+    status: str
+    executed_qty: float
+    executed_price: float
+    
+    @classmethod
+    def from_order_result(cls, order_result: Dict[str, Any]) -> "OrderFill":
+        return cls(
+            order_result.get("order_id"),
+            order_result.get("status", "UNKNOWN"),
+            float(order_result.get("executed_quantity", 0.0)),
+            float(order_result.get("executed_price", 0.0))
+        )
+
+class Positions:
+    """
+    Posiciones activas en layout SoA (arrays float64 paralelos indexados por símbolo)
+    
+    `current_price` es NaN hasta que la posición se valora con un precio de mercado.
+    """
+    
+    _ARRAYS = ("qty", "avg_price", "cost", "current_price", "unrealized_pnl", "pnl_percentage")
+    
+    def __init__(self):
+        self.symbols: List[str] = []
+        self.symbol_to_idx: Dict[str, int] = {}
+        self.trades: List[List[Dict[str, Any]]] = []
+        self.qty = np.empty(0, dtype=np.float64)
+        self.avg_price = np.empty(0, dtype=np.float64)
+        self.cost = np.empty(0, dtype=np.float64)
+        self.current_price = np.empty(0, dtype=np.float64)
+        self.unrealized_pnl = np.empty(0, dtype=np.float64)
+        self.pnl_percentage = np.empty(0, dtype=np.float64)
+    
+    def __len__(self) -> int:
+        return len(self.symbols)
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbol_to_idx
+    
+    def index(self, symbol: str) -> int:
+        """Índice del símbolo, agregando una posición vacía si no existe"""
+        idx = self.symbol_to_idx.get(symbol)
+        if idx is None:
+            idx = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_to_idx[symbol] = idx
+            self.trades.append([])
+            self.qty = np.append(self.qty, 0.0)
+            self.avg_price = np.append(self.avg_price, 0.0)
+            self.cost = np.append(self.cost, 0.0)
+            self.current_price = np.append(self.current_price, np.nan)
+            self.unrealized_pnl = np.append(self.unrealized_pnl, 0.0)
+            self.pnl_percentage = np.append(self.pnl_percentage, 0.0)
+        return idx
+    
+    def quantity(self, symbol: str) -> float:
+        """Cantidad en posición para un símbolo (0 si no existe)"""
+        idx = self.symbol_to_idx.get(symbol)
+        return float(self.qty[idx]) if idx is not None else 0.0
+    
+    def apply_buy(self, idx: int, quantity: float, price: float):
+        """Aumentar posición recalculando el precio promedio"""
+        _apply_buy(self.qty, self.avg_price, self.cost, idx, float(quantity), float(price))
+    
+    def apply_sell(self, idx: int, quantity: float):
+        """Reducir posición; si llega a 0 la posición queda cerrada"""
+        _apply_sell(self.qty, self.avg_price, self.cost, idx, float(quantity))
+    
+    def realized_pnl(self, symbol: str, quantity: float, price: float) -> Optional[float]:
+        """PnL de vender `quantity` a `price` contra el precio promedio (None sin posición abierta)"""
+        idx = self.symbol_to_idx.get(symbol)
+        if idx is None or self.qty[idx] <= 0:
+            return None
+        closed = min(float(quantity), float(self.qty[idx]))
+        return (float(price) - float(self.avg_price[idx])) * closed
+    
+    def open_symbols(self) -> List[str]:
+        """Símbolos con cantidad > 0"""
+        return [symbol for symbol, is_open in zip(self.symbols, self.qty > 0) if is_open]
+    
+    def mark_to_market(self, prices: Dict[str, float]):
+        """Valorar posiciones con precios actuales y descartar las cerradas"""
+        current = np.fromiter(
+            (prices.get(symbol) or np.nan for symbol in self.symbols),
+            dtype=np.float64, count=len(self.symbols)
+        )
+        # Las posiciones sin precio en esta consulta conservan el último conocido
+        current = np.where(current > 0, current, self.current_price)
+        self.current_price = current
+        _recompute_pnl(self.qty, self.avg_price, self.cost, current, self.unrealized_pnl, self.pnl_percentage)
+        # Nunca valoradas: PnL 0 como al abrirlas
+        self.unrealized_pnl[np.isnan(current)] = 0.0
+        
+        keep = self.qty > 0
+        if not keep.all():
+            self._compact(keep)
+    
+    def _compact(self, keep: np.ndarray):
+        drop = np.flatnonzero(~keep)
+        if len(drop) * 4 <= len(self.symbols):
+            # Pocas bajas: quitarlas en sitio sin reconstruir índices ni arrays
+            for idx in drop[::-1].tolist():
+                self._swap_remove(idx)
+            return
+        
+        indices = np.flatnonzero(keep)
+        self.symbols = [self.symbols[i] for i in indices]
+        self.trades = [self.trades[i] for i in indices]
+        self.symbol_to_idx = {symbol: i for i, symbol in enumerate(self.symbols)}
+        for name in self._ARRAYS:
+            setattr(self, name, getattr(self, name)[keep])
+    
+    def _swap_remove(self, idx: int):
+        """Quitar una fila moviendo la última a su lugar (O(1); no preserva el orden)"""
+        last = len(self.symbols) - 1
+        removed = self.symbols[idx]
+        if idx != last:
+            moved = self.symbols[last]
+            self.symbols[idx] = moved
+            self.trades[idx] = self.trades[last]
+            self.symbol_to_idx[moved] = idx
+            for name in self._ARRAYS:
+                array = getattr(self, name)
+                array[idx] = array[last]
+        
+        self.symbols.pop()
+        self.trades.pop()
+        del self.symbol_to_idx[removed]
+        for name in self._ARRAYS:
+            setattr(self, name, getattr(self, name)[:last])
+    
+    def total_unrealized_pnl(self) -> float:
+        return float(self.unrealized_pnl.sum())
+    
+    def total_value(self) -> float:
+        """Valor de mercado de las posiciones ya valoradas"""
+        return float(np.nansum(self.current_price * self.qty))
+    
+    def open_count(self) -> int:
+        return int(np.count_nonzero(self.qty > 0))
+    
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Posiciones como diccionario símbolo -> campos (formato JSON expuesto)"""
+        columns = zip(
+            self.symbols, self.qty.tolist(), self.avg_price.tolist(), self.cost.tolist(),
+            self.unrealized_pnl.tolist(), self.current_price.tolist(), self.pnl_percentage.tolist(),
+            self.trades
+        )
+        positions = {}
+        for symbol, qty, avg_price, cost, pnl, current_price, pnl_percentage, trades in columns:
+            position = {
+                "quantity": qty,
+                "average_price": avg_price,
+                "total_cost": cost,
+                "unrealized_pnl": pnl,
+                "trades": trades
+            }
+            if not math.isnan(current_price):
+                position["current_price"] = current_price
+                position["pnl_percentage"] = pnl_percentage
+            positions[symbol] = position
+        return positions
+
 class TradingAgent(BaseAgent):
     """
     Agente especializado en ejecución de operaciones de trading
@@ -26,6 +256,22 @@ class TradingAgent(BaseAgent):
     - Reportar resultados de trading
     """
     
+    # Tipo de tarea -> nombre del método que la procesa
+    _HANDLERS = {
+        "execute_trade": "_execute_trade",
+        "close_position": "_close_position",
+        "update_stop_loss": "_update_stop_loss",
+        "update_take_profit": "_update_take_profit",
+        "check_positions": "_check_positions",
+        "cancel_order": "_cancel_order",
+        "get_portfolio_status": "_get_portfolio_status"
+    }
+    
+    # Tareas que solo tocan el estado de un símbolo: se ejecutan en la cola de ese símbolo
+    _SYMBOL_SCOPED_TASKS = frozenset({
+        "execute_trade", "close_position", "update_stop_loss", "update_take_profit", "cancel_order"
+    })
+    
     def __init__(self):
         super().__init__(
             name="TradingAgent",
@@ -33,9 +279,31 @@ class TradingAgent(BaseAgent):
         )
         self.binance_service: Optional[BinanceService] = None
         self.risk_manager: Optional[RiskManager] = None
-        self.active_positions = {}
+        self.active_positions = Positions()
         self.pending_orders = {}
+        # Índices inversos de pending_orders: order_id -> claves y trade_id -> {tipo: clave}
+        self._order_id_to_keys: Dict[Any, List[str]] = {}
+        self._trade_id_to_keys: Dict[str, Dict[str, str]] = {}
         self.trading_session_id = None
+        # IDs de trade: prefijo aleatorio de 64 bits por sesión + contador monotónico
+        # (el contador se reinicia en cada sesión; el prefijo evita choques entre sesiones)
+        self._trade_prefix = secrets.token_hex(TRADE_ID_PREFIX_BYTES)
+        self._trade_counter = itertools.count()
+        # Cola de trades pendientes de persistir: (trade_data, future con el id en BD)
+        self._trade_write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # Balance USDT cacheado (valor, timestamp monotónico) y su posición en la lista de balances
+        self._balance_cache: Optional[Tuple[float, float]] = None
+        self._usdt_balance_idx: Optional[int] = None
+        # Última ejecución (monotónica) de cada verificación periódica
+        self._last_positions_check = 0.0
+        self._last_orders_check = 0.0
+        # Colas y workers por símbolo para que símbolos distintos no se bloqueen entre sí
+        self._symbol_queues: Dict[str, asyncio.Queue] = {}
+        self._symbol_workers: Dict[str, asyncio.Task] = {}
+        # Tareas por símbolo en ejecución (task_id -> tarea)
+        self._running_tasks: Dict[str, AgentTask] = {}
+        self._handlers = {task_type: getattr(self, name) for task_type, name in self._HANDLERS.items()}
         
     async def _initialize_agent(self):
         """Inicializar servicios del agente de trading"""
@@ -47,17 +315,28 @@ class TradingAgent(BaseAgent):
         self.risk_manager = RiskManager()
         await self.risk_manager.initialize()
         
+        # Referencias fijas para el camino crítico (evita resolver atributos en cada trade/tick)
+        self._place_order = self.binance_service.place_order
+        self._get_prices = self.binance_service.get_current_prices
+        self._log_info = self.logger.info
+        self._utcnow = datetime.utcnow
+        
         # Crear sesión de trading
         await self._create_trading_session()
         
+        # Escritor en segundo plano para registrar trades fuera del camino crítico
+        self._trade_write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._trade_writer_loop())
+        
         self.logger.info("TradingAgent inicializado con servicios de Binance y gestión de riesgo")
     
     async def _create_trading_session(self):
         """Crear nueva sesión de trading"""
         try:
+            now = self._utcnow()
             session_data = {
-                "session_id": f"trading_session_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
-                "start_time": datetime.utcnow(),
+                "session_id": f"trading_session_{now.strftime('%Y%m%d_%H%M%S')}",
+                "start_time": now,
                 "status": "active",
                 "initial_balance": 1000.0,  # Balance inicial en testnet
                 "current_balance": 1000.0,
@@ -71,6 +350,8 @@ class TradingAgent(BaseAgent):
             
             session = await DatabaseManager.create_trading_session(session_data)
             self.trading_session_id = session.session_id
+            self._trade_prefix = secrets.token_hex(TRADE_ID_PREFIX_BYTES)
+            self._trade_counter = itertools.count()
             
             self.logger.info(f"Sesión de trading creada: {self.trading_session_id}")
             
@@ -78,27 +359,67 @@ class TradingAgent(BaseAgent):
             self.logger.error(f"Error creando sesión de trading: {e}")
             raise
     
+    async def _execute_task(self, task: AgentTask):
+        """
+        Encaminar la tarea a la cola de su símbolo
+        
+        Las tareas globales (portafolio, posiciones) esperan a que se vacíen todas
+        las colas por símbolo para operar sobre un estado consistente.
+        """
+        symbol = self._task_symbol(task)
+        
+        if symbol is None:
+            await self._drain_symbol_queues()
+            await super()._execute_task(task)
+            return
+        
+        queue = self._symbol_queues.get(symbol)
+        if queue is None:
+            queue = self._symbol_queues[symbol] = asyncio.Queue()
+            self._symbol_workers[symbol] = asyncio.create_task(self._symbol_worker(queue))
+        queue.put_nowait(task)
+    
+    def _task_symbol(self, task: AgentTask) -> Optional[str]:
+        """Símbolo al que afecta una tarea, o None si es global"""
+        if task.task_type not in self._SYMBOL_SCOPED_TASKS:
+            return None
+        
+        symbol = task.parameters.get("symbol")
+        if symbol is None:
+            # update_stop_loss / update_take_profit llegan con trade_id: resolver por sus órdenes
+            for key in self._trade_id_to_keys.get(task.parameters.get("trade_id"), {}).values():
+                return self.pending_orders[key]["symbol"]
+        return symbol
+    
+    async def _symbol_worker(self, queue: asyncio.Queue):
+        """
+        Ejecutar en orden las tareas de un símbolo
+        
+        Los workers corren en paralelo, así que no usan current_task/status
+        (un único valor compartido que AgentManager consulta): cada tarea en
+        curso queda registrada en _running_tasks hasta que termina.
+        """
+        while True:
+            task = await queue.get()
+            self._running_tasks[task.task_id] = task
+            try:
+                await self._run_task(task)
+            finally:
+                del self._running_tasks[task.task_id]
+                queue.task_done()
+    
+    async def _drain_symbol_queues(self):
+        """Punto de sincronización: esperar a que terminen las tareas por símbolo encoladas"""
+        if self._symbol_queues:
+            await asyncio.gather(*(queue.join() for queue in self._symbol_queues.values()))
+    
     async def _process_task(self, task: AgentTask) -> Any:
         """Procesar tareas de trading"""
-        task_type = task.task_type
-        parameters = task.parameters
-        
-        if task_type == "execute_trade":
-            return await self._execute_trade(parameters)
-        elif task_type == "close_position":
-            return await self._close_position(parameters)
-        elif task_type == "update_stop_loss":
-            return await self._update_stop_loss(parameters)
-        elif task_type == "update_take_profit":
-            return await self._update_take_profit(parameters)
-        elif task_type == "check_positions":
-            return await self._check_positions(parameters)
-        elif task_type == "cancel_order":
-            return await self._cancel_order(parameters)
-        elif task_type == "get_portfolio_status":
-            return await self._get_portfolio_status(parameters)
-        else:
-            raise ValueError(f"Tipo de tarea no soportado: {task_type}")
+        handler = self._handlers.get(task.task_type)
+        if handler is None:
+            raise ValueError(f"Tipo de tarea no soportado: {task.task_type}")
+        
+        return await handler(task.parameters)
     
     async def _execute_trade(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -122,7 +443,7 @@ class TradingAgent(BaseAgent):
         if not all([symbol, side, quantity]):
             raise ValueError("Parámetros requeridos: symbol, side, quantity")
         
-        self.logger.info(f"Ejecutando trade: {side} {quantity} {symbol}")
+        self._log_info("Ejecutando trade: %s %s %s", side, quantity, symbol)
         
         try:
             # Verificar riesgo antes de ejecutar
@@ -131,7 +452,7 @@ class TradingAgent(BaseAgent):
                 "side": side,
                 "quantity": quantity,
                 "current_balance": await self._get_current_balance(),
-                "active_positions": self.active_positions
+                "active_positions": self.active_positions.as_dict()
             })
             
             if not risk_check["approved"]:
@@ -142,7 +463,7 @@ class TradingAgent(BaseAgent):
                 }
             
             # Ejecutar orden en Binance
-            order_result = await self.binance_service.place_order(
+            order_result = await self._place_order(
                 symbol=symbol,
                 side=side,
                 order_type=order_type,
@@ -157,8 +478,13 @@ class TradingAgent(BaseAgent):
                     "order_result": order_result
                 }
             
+            # La orden mueve el balance: no reutilizar el valor cacheado
+            self._balance_cache = None
+            
+            fill = OrderFill.from_order_result(order_result)
+            
             # Generar ID único para el trade
-            trade_id = f"trade_{uuid.uuid4().hex[:8]}"
+            trade_id = f"trade_{self._trade_prefix}_{next(self._trade_counter):06x}"
             
             # Registrar trade en base de datos
             trade_data = {
@@ -169,36 +495,46 @@ class TradingAgent(BaseAgent):
                 "order_type": order_type,
                 "quantity": float(quantity),
                 "price": float(price) if price else None,
-                "executed_price": float(order_result.get("executed_price", 0)),
-                "executed_quantity": float(order_result.get("executed_quantity", 0)),
-                "status": order_result.get("status", "UNKNOWN"),
+                "executed_price": fill.executed_price,
+                "executed_quantity": fill.executed_qty,
+                "status": fill.status,
                 "strategy": strategy,
                 "agent": self.name,
                 "stop_loss": float(stop_loss) if stop_loss else None,
                 "take_profit": float(take_profit) if take_profit else None,
-                "metadata": {
-                    "binance_order_id": order_result.get("order_id"),
+                "trade_metadata": {
+                    "binance_order_id": fill.order_id,
                     "risk_check": risk_check,
                     "parameters": parameters
                 }
             }
             
-            trade_record = await DatabaseManager.record_trade(trade_data)
+            # Una venta ejecutada cierra (parte de) la posición: registrar el PnL realizado
+            # para que /performance la cuente como trade cerrado
+            if side == "SELL" and fill.status == "FILLED":
+                realized_pnl = self.active_positions.realized_pnl(symbol, fill.executed_qty, fill.executed_price)
+                if realized_pnl is not None:
+                    trade_data["pnl"] = realized_pnl
+                    trade_data["exit_time"] = self._utcnow()
+            
+            # Encolar el registro en BD; el trade continúa con un registro provisional
+            trade_record = self._queue_trade_record(trade_data)
             
             # Actualizar posiciones activas
-            if order_result.get("status") == "FILLED":
-                await self._update_active_positions(trade_record, order_result)
+            if fill.status == "FILLED":
+                await self._update_active_positions(trade_record, fill)
                 
                 # Configurar stop-loss y take-profit si se especificaron
                 if stop_loss or take_profit:
-                    await self._setup_exit_orders(trade_record, stop_loss, take_profit)
+                    await self._setup_exit_orders(trade_record, fill, stop_loss, take_profit)
             
             result = {
                 "success": True,
                 "trade_id": trade_id,
                 "order_result": order_result,
                 "trade_record": {
-                    "id": trade_record.id,
+                    # El id en BD se asigna al volcar el lote: se identifica por trade_id
+                    "id": trade_record.trade_id,
                     "symbol": trade_record.symbol,
                     "side": trade_record.side,
                     "quantity": trade_record.quantity,
@@ -208,7 +544,7 @@ class TradingAgent(BaseAgent):
                 "risk_check": risk_check
             }
             
-            self.logger.info(f"Trade ejecutado exitosamente: {trade_id}")
+            self._log_info("Trade ejecutado exitosamente: %s", trade_id)
             return result
             
         except Exception as e:
@@ -218,104 +554,197 @@ class TradingAgent(BaseAgent):
                 "error": str(e)
             }
     
-    async def _update_active_positions(self, trade_record, order_result: Dict[str, Any]):
+    def _queue_trade_record(self, trade_data: Dict[str, Any]) -> SimpleNamespace:
+        """
+        Encolar un trade para escritura en lote
+        
+        Returns:
+            Registro provisional con los campos del trade; `id` es None hasta el volcado
+            y `record_id` es un Future que se resuelve con el id en BD (o None si falla)
+        """
+        record_id = asyncio.get_running_loop().create_future()
+        self._trade_write_queue.put_nowait((trade_data, record_id))
+        return SimpleNamespace(id=None, record_id=record_id, **trade_data)
+    
+    async def _trade_writer_loop(self):
+        """Volcar trades encolados a la base de datos en lotes"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._trade_write_queue.get()]
+            
+            # Agrupar lo que llegue dentro de la ventana, hasta el tamaño máximo de lote
+            deadline = loop.time() + TRADE_WRITE_BATCH_TIMEOUT
+            while len(batch) < TRADE_WRITE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._trade_write_queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self._flush_trade_batch(batch)
+            for _ in batch:
+                self._trade_write_queue.task_done()
+    
+    async def _flush_trade_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Registrar un lote de trades y resolver sus futures con los ids"""
+        try:
+            records = await DatabaseManager.record_trades_bulk([trade_data for trade_data, _ in batch])
+            record_ids = [record.id for record in records]
+        except Exception as e:
+            # Una fila inválida (p. ej. trade_id duplicado) no debe perder el resto del lote
+            self.logger.error(f"Error registrando lote de {len(batch)} trades, reintentando uno a uno: {e}")
+            record_ids = [await self._record_trade_single(trade_data) for trade_data, _ in batch]
+        
+        for (_, record_id), value in zip(batch, record_ids):
+            if not record_id.done():
+                record_id.set_result(value)
+    
+    async def _record_trade_single(self, trade_data: Dict[str, Any]) -> Optional[int]:
+        """Registrar un trade individual; devuelve su id o None si falla"""
+        try:
+            record = await DatabaseManager.record_trade(trade_data)
+            return record.id
+        except Exception as e:
+            self.logger.error(f"Error registrando trade {trade_data.get('trade_id')}: {e}")
+            return None
+    
+    async def stop(self):
+        """Detener el agente volcando los trades pendientes de registrar"""
+        await super().stop()
+        
+        # Terminar las tareas por símbolo en curso: una orden ya ejecutada en Binance
+        # debe llegar a encolar su trade antes de cancelar los workers
+        await self._drain_symbol_queues()
+        for worker in self._symbol_workers.values():
+            worker.cancel()
+        self._symbol_workers.clear()
+        self._symbol_queues.clear()
+        
+        if self._writer_task is not None:
+            # Esperar a que el escritor vacíe la cola antes de cancelarlo
+            await self._trade_write_queue.join()
+            self._writer_task.cancel()
+            self._writer_task = None
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Estado del agente, incluyendo las tareas por símbolo en ejecución"""
+        status = super().get_status()
+        status["running_tasks"] = list(self._running_tasks)
+        return status
+    
+    async def _update_active_positions(self, trade_record, fill: OrderFill):
         """Actualizar posiciones activas"""
         symbol = trade_record.symbol
         side = trade_record.side
-        quantity = float(order_result.get("executed_quantity", 0))
-        price = float(order_result.get("executed_price", 0))
-        
-        if symbol not in self.active_positions:
-            self.active_positions[symbol] = {
-                "quantity": 0.0,
-                "average_price": 0.0,
-                "total_cost": 0.0,
-                "unrealized_pnl": 0.0,
-                "trades": []
-            }
+        quantity = fill.executed_qty
+        price = fill.executed_price
         
-        position = self.active_positions[symbol]
+        positions = self.active_positions
+        idx = positions.index(symbol)
         
         if side == "BUY":
-            # Aumentar posición
-            new_total_cost = position["total_cost"] + (quantity * price)
-            new_quantity = position["quantity"] + quantity
-            position["average_price"] = new_total_cost / new_quantity if new_quantity > 0 else 0
-            position["quantity"] = new_quantity
-            position["total_cost"] = new_total_cost
+            positions.apply_buy(idx, quantity, price)
         else:  # SELL
-            # Reducir posición
-            position["quantity"] -= quantity
-            if position["quantity"] <= 0:
-                # Posición cerrada
-                position["quantity"] = 0
-                position["average_price"] = 0
-                position["total_cost"] = 0
-        
-        position["trades"].append({
+            positions.apply_sell(idx, quantity)
+        
+        trade_log = positions.trades[idx]
+        trade_log.append({
             "trade_id": trade_record.trade_id,
             "side": side,
             "quantity": quantity,
             "price": price,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self._utcnow().isoformat()
         })
         
-        self.logger.debug(f"Posición actualizada para {symbol}: {position}")
+        self.logger.debug(
+            "Posición actualizada para %s: cantidad=%s, precio promedio=%s",
+            symbol, positions.qty[idx], positions.avg_price[idx]
+        )
     
-    async def _setup_exit_orders(self, trade_record, stop_loss: float = None, take_profit: float = None):
+    async def _setup_exit_orders(self, trade_record, fill: OrderFill,
+                                 stop_loss: float = None, take_profit: float = None):
         """Configurar órdenes de salida (stop-loss y take-profit)"""
         try:
             symbol = trade_record.symbol
             side = trade_record.side
-            quantity = trade_record.executed_quantity
+            quantity = fill.executed_qty
+            trade_id = trade_record.trade_id
             
             # Determinar lado opuesto para órdenes de salida
             exit_side = "SELL" if side == "BUY" else "BUY"
             
-            # Configurar stop-loss
+            # Stop-loss y take-profit son independientes: enviarlos concurrentemente
+            legs = []
             if stop_loss:
-                stop_order = await self.binance_service.place_order(
+                legs.append(("stop_loss", stop_loss, self._place_order(
                     symbol=symbol,
                     side=exit_side,
                     order_type="STOP_LOSS_LIMIT",
                     quantity=quantity,
                     price=stop_loss,
                     stop_price=stop_loss
-                )
-                
-                if stop_order["success"]:
-                    self.pending_orders[f"{trade_record.trade_id}_stop_loss"] = {
-                        "order_id": stop_order.get("order_id"),
-                        "type": "stop_loss",
-                        "trade_id": trade_record.trade_id,
-                        "symbol": symbol,
-                        "price": stop_loss
-                    }
-                    self.logger.info(f"Stop-loss configurado para {trade_record.trade_id} en {stop_loss}")
-            
-            # Configurar take-profit
+                )))
             if take_profit:
-                tp_order = await self.binance_service.place_order(
+                legs.append(("take_profit", take_profit, self._place_order(
                     symbol=symbol,
                     side=exit_side,
                     order_type="LIMIT",
                     quantity=quantity,
                     price=take_profit
-                )
+                )))
+            
+            results = await asyncio.gather(*(order for _, _, order in legs), return_exceptions=True)
+            
+            for (order_type, exit_price, _), exit_order in zip(legs, results):
+                if isinstance(exit_order, Exception):
+                    self.logger.error(f"Error configurando {order_type} para {trade_id}: {exit_order}")
+                    continue
                 
-                if tp_order["success"]:
-                    self.pending_orders[f"{trade_record.trade_id}_take_profit"] = {
-                        "order_id": tp_order.get("order_id"),
-                        "type": "take_profit",
-                        "trade_id": trade_record.trade_id,
+                if exit_order["success"]:
+                    self._add_pending(f"{trade_id}_{order_type}", {
+                        "order_id": exit_order.get("order_id"),
+                        "type": order_type,
+                        "trade_id": trade_id,
                         "symbol": symbol,
-                        "price": take_profit
-                    }
-                    self.logger.info(f"Take-profit configurado para {trade_record.trade_id} en {take_profit}")
+                        "price": exit_price
+                    })
+                    self._log_info(
+                        "%s configurado para %s en %s",
+                        "Stop-loss" if order_type == "stop_loss" else "Take-profit", trade_id, exit_price
+                    )
                     
         except Exception as e:
             self.logger.error(f"Error configurando órdenes de salida: {e}")
     
+    def _add_pending(self, key: str, order_info: Dict[str, Any]):
+        """Registrar una orden pendiente manteniendo los índices inversos"""
+        self.pending_orders[key] = order_info
+        self._order_id_to_keys.setdefault(order_info["order_id"], []).append(key)
+        self._trade_id_to_keys.setdefault(order_info["trade_id"], {})[order_info["type"]] = key
+    
+    def _remove_pending(self, key: str) -> Optional[Dict[str, Any]]:
+        """Quitar una orden pendiente (si existe) de pending_orders y de los índices"""
+        order_info = self.pending_orders.pop(key, None)
+        if order_info is None:
+            return None
+        
+        keys = self._order_id_to_keys.get(order_info["order_id"])
+        if keys is not None:
+            if key in keys:
+                keys.remove(key)
+            if not keys:
+                del self._order_id_to_keys[order_info["order_id"]]
+        
+        trade_keys = self._trade_id_to_keys.get(order_info["trade_id"])
+        if trade_keys is not None:
+            trade_keys.pop(order_info["type"], None)
+            if not trade_keys:
+                del self._trade_id_to_keys[order_info["trade_id"]]
+        
+        return order_info
+    
     async def _close_position(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Cerrar una posición específica"""
         symbol = parameters.get("symbol")
@@ -324,14 +753,14 @@ class TradingAgent(BaseAgent):
         if not symbol:
             raise ValueError("Se requiere especificar el símbolo")
         
-        if symbol not in self.active_positions or self.active_positions[symbol]["quantity"] <= 0:
+        position_quantity = self.active_positions.quantity(symbol)
+        if position_quantity <= 0:
             return {
                 "success": False,
                 "error": f"No hay posición activa para {symbol}"
             }
         
-        position = self.active_positions[symbol]
-        close_quantity = quantity if quantity else position["quantity"]
+        close_quantity = quantity if quantity else position_quantity
         
         # Determinar lado de cierre
         close_side = "SELL"  # Asumiendo posiciones largas por simplicidad
@@ -361,30 +790,18 @@ class TradingAgent(BaseAgent):
     async def _check_positions(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Verificar y actualizar estado de posiciones"""
         try:
-            # Obtener precios actuales para calcular PnL
-            updated_positions = {}
+            # Obtener precios actuales para calcular PnL (un solo request para todos los símbolos)
+            symbols = self.active_positions.open_symbols()
+            prices = await self._get_prices(symbols)
             
-            for symbol, position in self.active_positions.items():
-                if position["quantity"] > 0:
-                    # Obtener precio actual
-                    current_price = await self.binance_service.get_current_price(symbol)
-                    
-                    if current_price:
-                        # Calcular PnL no realizado
-                        unrealized_pnl = (current_price - position["average_price"]) * position["quantity"]
-                        position["unrealized_pnl"] = unrealized_pnl
-                        position["current_price"] = current_price
-                        position["pnl_percentage"] = (unrealized_pnl / position["total_cost"]) * 100 if position["total_cost"] > 0 else 0
-                        
-                        updated_positions[symbol] = position
-            
-            self.active_positions = updated_positions
+            # PnL de todas las posiciones en una sola pasada vectorizada
+            self.active_positions.mark_to_market(prices)
             
             return {
                 "success": True,
-                "positions": self.active_positions,
-                "total_unrealized_pnl": sum(pos["unrealized_pnl"] for pos in self.active_positions.values()),
-                "timestamp": datetime.utcnow().isoformat()
+                "positions": self.active_positions.as_dict(),
+                "total_unrealized_pnl": self.active_positions.total_unrealized_pnl(),
+                "timestamp": self._utcnow().isoformat()
             }
             
         except Exception as e:
@@ -404,22 +821,22 @@ class TradingAgent(BaseAgent):
             current_balance = await self._get_current_balance()
             
             # Calcular métricas del portafolio
-            total_unrealized_pnl = sum(pos["unrealized_pnl"] for pos in self.active_positions.values())
-            total_position_value = sum(pos["current_price"] * pos["quantity"] for pos in self.active_positions.values() if "current_price" in pos)
+            total_unrealized_pnl = self.active_positions.total_unrealized_pnl()
+            total_position_value = self.active_positions.total_value()
             
             portfolio_status = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": self._utcnow().isoformat(),
                 "session_id": self.trading_session_id,
                 "current_balance": current_balance,
                 "total_position_value": total_position_value,
                 "total_unrealized_pnl": total_unrealized_pnl,
                 "total_portfolio_value": current_balance + total_position_value,
-                "active_positions": self.active_positions,
+                "active_positions": positions_result.get("positions") or self.active_positions.as_dict(),
                 "pending_orders": len(self.pending_orders),
                 "performance": {
                     "total_return": total_unrealized_pnl,
                     "return_percentage": (total_unrealized_pnl / 1000.0) * 100,  # Asumiendo balance inicial de 1000
-                    "active_positions_count": len([pos for pos in self.active_positions.values() if pos["quantity"] > 0])
+                    "active_positions_count": self.active_positions.open_count()
                 }
             }
             
@@ -437,18 +854,35 @@ class TradingAgent(BaseAgent):
     
     async def _get_current_balance(self) -> float:
         """Obtener balance actual de la cuenta"""
+        now = time.monotonic()
+        if self._balance_cache is not None and now - self._balance_cache[1] < BALANCE_CACHE_TTL:
+            return self._balance_cache[0]
+        
         try:
             account_info = await self.binance_service.get_account_info()
             if account_info and "balances" in account_info:
-                # Buscar balance de USDT
-                for balance in account_info["balances"]:
-                    if balance["asset"] == "USDT":
-                        return float(balance["free"]) + float(balance["locked"])
+                usdt = self._find_usdt_balance(account_info["balances"])
+                if usdt is not None:
+                    balance = float(usdt["free"]) + float(usdt["locked"])
+                    self._balance_cache = (balance, now)
+                    return balance
             return 1000.0  # Balance por defecto para testnet
         except Exception as e:
             self.logger.error(f"Error obteniendo balance: {e}")
             return 1000.0
     
+    def _find_usdt_balance(self, balances: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Buscar el balance de USDT probando primero la posición de la última consulta"""
+        idx = self._usdt_balance_idx
+        if idx is not None and idx < len(balances) and balances[idx]["asset"] == "USDT":
+            return balances[idx]
+        
+        for idx, balance in enumerate(balances):
+            if balance["asset"] == "USDT":
+                self._usdt_balance_idx = idx
+                return balance
+        return None
+    
     async def _update_stop_loss(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Actualizar stop-loss de una posición"""
         trade_id = parameters.get("trade_id")
@@ -459,9 +893,9 @@ class TradingAgent(BaseAgent):
         
         try:
             # Buscar orden de stop-loss existente
-            stop_loss_key = f"{trade_id}_stop_loss"
+            stop_loss_key = self._trade_id_to_keys.get(trade_id, {}).get("stop_loss")
             
-            if stop_loss_key in self.pending_orders:
+            if stop_loss_key is not None:
                 # Cancelar orden existente
                 old_order = self.pending_orders[stop_loss_key]
                 cancel_result = await self.binance_service.cancel_order(
@@ -470,7 +904,7 @@ class TradingAgent(BaseAgent):
                 )
                 
                 if cancel_result["success"]:
-                    del self.pending_orders[stop_loss_key]
+                    self._remove_pending(stop_loss_key)
             
             # Crear nueva orden de stop-loss
             # (Implementación simplificada - en producción necesitaría más detalles)
@@ -498,9 +932,9 @@ class TradingAgent(BaseAgent):
         
         try:
             # Similar a update_stop_loss pero para take-profit
-            tp_key = f"{trade_id}_take_profit"
+            tp_key = self._trade_id_to_keys.get(trade_id, {}).get("take_profit")
             
-            if tp_key in self.pending_orders:
+            if tp_key is not None:
                 old_order = self.pending_orders[tp_key]
                 cancel_result = await self.binance_service.cancel_order(
                     old_order["symbol"], 
@@ -508,7 +942,7 @@ class TradingAgent(BaseAgent):
                 )
                 
                 if cancel_result["success"]:
-                    del self.pending_orders[tp_key]
+                    self._remove_pending(tp_key)
             
             return {
                 "success": True,
@@ -535,13 +969,8 @@ class TradingAgent(BaseAgent):
             result = await self.binance_service.cancel_order(symbol, order_id)
             
             # Remover de órdenes pendientes si existe
-            keys_to_remove = []
-            for key, order_info in self.pending_orders.items():
-                if order_info["order_id"] == order_id:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self.pending_orders[key]
+            for key in list(self._order_id_to_keys.get(order_id, ())):
+                self._remove_pending(key)
             
             return result
             
@@ -554,12 +983,17 @@ class TradingAgent(BaseAgent):
     
     async def _periodic_tasks(self):
         """Tareas periódicas del agente de trading"""
+        now = time.monotonic()
+        
         # Verificar posiciones cada minuto
-        if len(self.active_positions) > 0:
+        if len(self.active_positions) > 0 and now - self._last_positions_check >= POSITIONS_CHECK_INTERVAL:
+            self._last_positions_check = now
+            await self._drain_symbol_queues()
             await self._check_positions({})
         
         # Verificar órdenes pendientes
-        if len(self.pending_orders) > 0:
+        if len(self.pending_orders) > 0 and now - self._last_orders_check >= PENDING_ORDERS_CHECK_INTERVAL:
+            self._last_orders_check = now
             await self._check_pending_orders()
         
         await asyncio.sleep(0.1)
@@ -569,22 +1003,30 @@ class TradingAgent(BaseAgent):
         try:
             orders_to_remove = []
             
-            for key, order_info in self.pending_orders.items():
-                # Verificar estado de la orden
-                order_status = await self.binance_service.get_order_status(
-                    order_info["symbol"], 
-                    order_info["order_id"]
-                )
+            # Consultar el estado de todas las órdenes en paralelo
+            items = list(self.pending_orders.items())
+            statuses = await asyncio.gather(
+                *(
+                    self.binance_service.get_order_status(order_info["symbol"], order_info["order_id"])
+                    for _, order_info in items
+                ),
+                return_exceptions=True
+            )
+            
+            for (key, order_info), order_status in zip(items, statuses):
+                if isinstance(order_status, Exception):
+                    self.logger.error(f"Error consultando orden {key}: {order_status}")
+                    continue
                 
                 if order_status and order_status.get("status") in ["FILLED", "CANCELED", "REJECTED"]:
                     orders_to_remove.append(key)
                     
                     if order_status.get("status") == "FILLED":
-                        self.logger.info(f"Orden {order_info['type']} ejecutada: {key}")
+                        self.logger.info("Orden %s ejecutada: %s", order_info["type"], key)
             
             # Remover órdenes completadas
             for key in orders_to_remove:
-                del self.pending_orders[key]
+                self._remove_pending(key)
                 
         except Exception as e:
             self.logger.error(f"Error verificando órdenes pendientes: {e}")
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Dependencias de FastAPI: servicios registrados en app.state durante el lifespan
+"""
+
+from fastapi import HTTPException, Request
+
+from backend.agents.agent_manager import AgentManager
+from backend.services.binance_service import BinanceService
+from backend.services.llm_service import LLMService
+from backend.services.risk_manager import RiskManager
+from backend.services.websocket_manager import WebSocketManager
+
+def get_agent_manager(request: Request) -> AgentManager:
+    """Obtener instancia del manager de agentes"""
+    agent_manager = getattr(request.app.state, "agent_manager", None)
+    if not agent_manager:
+        raise HTTPException(status_code=503, detail="Agent Manager no inicializado")
+    return agent_manager
+
+def get_websocket_manager(request: Request) -> WebSocketManager:
+    """Obtener instancia del manager de WebSocket"""
+    websocket_manager = getattr(request.app.state, "websocket_manager", None)
+    if not websocket_manager:
+        raise HTTPException(status_code=503, detail="WebSocket Manager no inicializado")
+    return websocket_manager
+
+def get_binance_service(request: Request) -> BinanceService:
+    """Obtener instancia del servicio de Binance"""
+    binance_service = getattr(request.app.state, "binance_service", None)
+    if not binance_service:
+        raise HTTPException(status_code=503, detail="Binance Service no inicializado")
+    return binance_service
+
+def get_llm_service(request: Request) -> LLMService:
+    """Obtener instancia del servicio LLM"""
+    llm_service = getattr(request.app.state, "llm_service", None)
+    if not llm_service:
+        raise HTTPException(status_code=503, detail="LLM Service no inicializado")
+    return llm_service
+
+def get_risk_manager(request: Request) -> RiskManager:
+    """Obtener instancia del gestor de riesgo"""
+    risk_manager = getattr(request.app.state, "risk_manager", None)
+    if not risk_manager:
+        raise HTTPException(status_code=503, detail="Risk Manager no inicializado")
+    return risk_manager
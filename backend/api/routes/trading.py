@@ -2,18 +2,50 @@
 API endpoints para operaciones de trading
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import asyncio
+import itertools
+import secrets
+
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel, ConfigDict
 from typing import Dict, Any, List, Optional
-from datetime import datetime
+from datetime import timedelta
+import numpy as np
 
 from backend.agents.agent_manager import AgentManager
+from backend.api.dependencies import get_agent_manager, get_websocket_manager
+from backend.core.cache import cached, invalidate
+from backend.core.database import DatabaseManager
+from backend.services.metrics import compute_performance
 from backend.services.websocket_manager import WebSocketManager
 
 router = APIRouter()
 
+# Ids de tarea únicos y ordenados por creación: prefijo aleatorio por proceso + contador
+_task_id_prefix = secrets.token_hex(2)
+_task_counter = itertools.count()
+
+# Columnas numéricas de una posición (una fila por símbolo) para agregarlas vectorizadas
+POSITIONS_DTYPE = np.dtype([("price", "f8"), ("qty", "f8"), ("upnl", "f8")])
+
+# Ventana de cada período de /performance
+PERFORMANCE_PERIODS = {
+    "1d": timedelta(days=1),
+    "1w": timedelta(weeks=1),
+    "1m": timedelta(days=30),
+    "3m": timedelta(days=90),
+    "1y": timedelta(days=365),
+}
+
+def _new_task_id(base: str) -> str:
+    """Construir un task_id único (dos peticiones en el mismo segundo no colisionan)"""
+    return f"{base}_{_task_id_prefix}{next(_task_counter):06x}"
+
 # Modelos Pydantic para requests/responses
 class TradeRequest(BaseModel):
+    # Inmutable y sin validación en asignación: el request sólo se lee
+    model_config = ConfigDict(frozen=True, validate_assignment=False)
+    
     symbol: str
     side: str  # BUY o SELL
     quantity: float
@@ -40,17 +72,12 @@ class PortfolioResponse(BaseModel):
     portfolio: Dict[str, Any]
     timestamp: str
 
-# Dependencias
-def get_agent_manager() -> AgentManager:
-    """Obtener instancia del AgentManager"""
-    # En producción, esto vendría del contexto de la aplicación
-    from backend.main import get_agent_manager
-    return get_agent_manager()
-
-def get_websocket_manager() -> WebSocketManager:
-    """Obtener instancia del WebSocketManager"""
-    from backend.main import get_websocket_manager
-    return get_websocket_manager()
+def warm_up_models():
+    """Validar un payload de ejemplo por modelo para que la primera petición real no pague la preparación"""
+    TradeRequest.model_validate({"symbol": "BTCUSDT", "side": "BUY", "quantity": 0.001})
+    TradeResponse.model_validate({"success": True, "message": ""})
+    PositionResponse.model_validate({"success": True, "positions": {}, "total_value": 0.0, "unrealized_pnl": 0.0})
+    PortfolioResponse.model_validate({"success": True, "portfolio": {}, "timestamp": ""})
 
 @router.post("/execute", response_model=TradeResponse)
 async def execute_trade(
@@ -66,25 +93,18 @@ async def execute_trade(
             raise HTTPException(status_code=503, detail="Sistema de agentes no disponible")
         
         # Ejecutar workflow de trading
-        workflow_result = await agent_manager.execute_trading_workflow({
-            "symbol": trade_request.symbol,
-            "side": trade_request.side,
-            "quantity": trade_request.quantity,
-            "order_type": trade_request.order_type,
-            "price": trade_request.price,
-            "stop_loss": trade_request.stop_loss,
-            "take_profit": trade_request.take_profit,
-            "strategy": trade_request.strategy
-        })
+        payload = trade_request.model_dump()
+        workflow_result = await agent_manager.execute_trading_workflow(payload)
+        await invalidate("portfolio")
         
         # Enviar actualización por WebSocket
         if ws_manager:
             await ws_manager.send_trade_update({
                 "workflow_id": workflow_result.get("workflow_id"),
                 "status": workflow_result.get("status"),
-                "symbol": trade_request.symbol,
-                "side": trade_request.side,
-                "quantity": trade_request.quantity
+                "symbol": payload["symbol"],
+                "side": payload["side"],
+                "quantity": payload["quantity"]
             })
         
         if workflow_result.get("status") == "completed":
@@ -105,6 +125,7 @@ async def execute_trade(
         raise HTTPException(status_code=500, detail=f"Error ejecutando trade: {str(e)}")
 
 @router.get("/positions", response_model=PositionResponse)
+@cached(expire=1, namespace="portfolio")
 async def get_positions(
     agent_manager: AgentManager = Depends(get_agent_manager)
 ):
@@ -119,14 +140,15 @@ async def get_positions(
         portfolio_status = await agent_manager._get_current_portfolio_status()
         
         active_positions = portfolio_status.get("active_positions", {})
-        total_unrealized_pnl = sum(
-            pos.get("unrealized_pnl", 0) for pos in active_positions.values()
-        )
-        total_position_value = sum(
-            pos.get("current_price", 0) * pos.get("quantity", 0) 
-            for pos in active_positions.values()
-            if pos.get("quantity", 0) > 0
+        arr = np.fromiter(
+            ((pos.get("current_price", 0), pos.get("quantity", 0), pos.get("unrealized_pnl", 0))
+             for pos in active_positions.values()),
+            dtype=POSITIONS_DTYPE,
+            count=len(active_positions)
         )
+        qty = arr["qty"]
+        total_unrealized_pnl = float(arr["upnl"].sum())
+        total_position_value = float((arr["price"] * qty).sum(where=qty > 0))
         
         return PositionResponse(
             success=True,
@@ -140,6 +162,7 @@ async def get_positions(
 
 @router.get("/portfolio", response_model=PortfolioResponse)
 async def get_portfolio(
+    request: Request,
     agent_manager: AgentManager = Depends(get_agent_manager),
     ws_manager: WebSocketManager = Depends(get_websocket_manager)
 ):
@@ -160,7 +183,7 @@ async def get_portfolio(
         return PortfolioResponse(
             success=True,
             portfolio=portfolio_status,
-            timestamp=datetime.utcnow().isoformat()
+            timestamp=request.state.now_iso
         )
         
     except Exception as e:
@@ -188,7 +211,7 @@ async def close_position(
         from backend.agents.base_agent import AgentTask
         
         task = AgentTask(
-            task_id=f"close_position_{symbol}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            task_id=_new_task_id(f"close_position_{symbol}"),
             task_type="close_position",
             parameters={
                 "symbol": symbol,
@@ -197,6 +220,7 @@ async def close_position(
         )
         
         await trading_agent.add_task(task)
+        await invalidate("portfolio")
         
         # Enviar actualización por WebSocket
         if ws_manager:
@@ -237,7 +261,7 @@ async def cancel_order(
         from backend.agents.base_agent import AgentTask
         
         task = AgentTask(
-            task_id=f"cancel_order_{order_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            task_id=_new_task_id(f"cancel_order_{order_id}"),
             task_type="cancel_order",
             parameters={
                 "symbol": symbol,
@@ -246,6 +270,7 @@ async def cancel_order(
         )
         
         await trading_agent.add_task(task)
+        await invalidate("portfolio")
         
         return {
             "success": True,
@@ -258,6 +283,7 @@ async def cancel_order(
 
 @router.get("/history")
 async def get_trading_history(
+    request: Request,
     symbol: Optional[str] = None,
     limit: int = 100,
     agent_manager: AgentManager = Depends(get_agent_manager)
@@ -283,7 +309,7 @@ async def get_trading_history(
         return {
             "success": True,
             "data": history,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": request.state.now_iso
         }
         
     except Exception as e:
@@ -291,32 +317,32 @@ async def get_trading_history(
 
 @router.get("/performance")
 async def get_trading_performance(
+    request: Request,
     period: str = "1d",  # 1d, 1w, 1m, 3m, 1y
     agent_manager: AgentManager = Depends(get_agent_manager)
 ):
     """
     Obtener métricas de performance de trading
     """
+    window = PERFORMANCE_PERIODS.get(period)
+    if window is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período no soportado: {period} (válidos: {', '.join(PERFORMANCE_PERIODS)})"
+        )
+    
     try:
-        # Obtener estado actual del portafolio
-        portfolio_status = await agent_manager._get_current_portfolio_status()
+        # Obtener estado actual del portafolio y PnL de trades cerrados en el período
+        since = request.state.now - window
+        portfolio_status, trade_pnls = await asyncio.gather(
+            agent_manager._get_current_portfolio_status(),
+            DatabaseManager.get_closed_trade_pnls(since)
+        )
         
-        # Calcular métricas básicas
+        # Calcular métricas
         performance = {
             "period": period,
-            "total_return": 0.0,
-            "total_return_pct": 0.0,
-            "sharpe_ratio": 0.0,
-            "max_drawdown": 0.0,
-            "win_rate": 0.0,
-            "profit_factor": 0.0,
-            "total_trades": 0,
-            "winning_trades": 0,
-            "losing_trades": 0,
-            "average_win": 0.0,
-            "average_loss": 0.0,
-            "largest_win": 0.0,
-            "largest_loss": 0.0,
+            **compute_performance(np.fromiter(trade_pnls, dtype=np.float64, count=len(trade_pnls))),
             "current_balance": portfolio_status.get("current_balance", 1000.0),
             "total_portfolio_value": portfolio_status.get("total_portfolio_value", 1000.0),
             "unrealized_pnl": portfolio_status.get("total_unrealized_pnl", 0.0)
@@ -325,14 +351,16 @@ async def get_trading_performance(
         return {
             "success": True,
             "performance": performance,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": request.state.now_iso
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo performance: {str(e)}")
 
 @router.get("/market-data/{symbol}")
+@cached(expire=5, namespace="market-data")
 async def get_market_data(
+    request: Request,
     symbol: str,
     timeframe: str = "1h",
     limit: int = 100
@@ -353,13 +381,13 @@ async def get_market_data(
             "high_24h": 46000.0,
             "low_24h": 44000.0,
             "data_points": limit,
-            "last_updated": datetime.utcnow().isoformat()
+            "last_updated": request.state.now_iso
         }
         
         return {
             "success": True,
             "data": market_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": request.state.now_iso
         }
         
     except Exception as e:
@@ -386,7 +414,7 @@ async def update_stop_loss(
         from backend.agents.base_agent import AgentTask
         
         task = AgentTask(
-            task_id=f"update_sl_{trade_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            task_id=_new_task_id(f"update_sl_{trade_id}"),
             task_type="update_stop_loss",
             parameters={
                 "trade_id": trade_id,
@@ -395,6 +423,7 @@ async def update_stop_loss(
         )
         
         await trading_agent.add_task(task)
+        await invalidate("portfolio")
         
         return {
             "success": True,
@@ -427,7 +456,7 @@ async def update_take_profit(
         from backend.agents.base_agent import AgentTask
         
         task = AgentTask(
-            task_id=f"update_tp_{trade_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            task_id=_new_task_id(f"update_tp_{trade_id}"),
             task_type="update_take_profit",
             parameters={
                 "trade_id": trade_id,
@@ -436,6 +465,7 @@ async def update_take_profit(
         )
         
         await trading_agent.add_task(task)
+        await invalidate("portfolio")
         
         return {
             "success": True,
@@ -448,7 +478,8 @@ async def update_take_profit(
         raise HTTPException(status_code=500, detail=f"Error actualizando take-profit: {str(e)}")
 
 @router.get("/account-info")
-async def get_account_info():
+@cached(expire=30, namespace="account")
+async def get_account_info(request: Request):
     """
     Obtener información de la cuenta de trading
     """
@@ -465,13 +496,13 @@ async def get_account_info():
                 {"asset": "ETH", "free": "0.00000000", "locked": "0.00000000"}
             ],
             "permissions": ["SPOT"],
-            "update_time": datetime.utcnow().isoformat()
+            "update_time": request.state.now_iso
         }
         
         return {
             "success": True,
             "account_info": account_info,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": request.state.now_iso
         }
         
     except Exception as e:
@@ -0,0 +1,66 @@
+"""
+Caché de respuestas de la API (fastapi-cache2 sobre Redis)
+"""
+
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from fastapi_cache import FastAPICache
+    from fastapi_cache.decorator import cache as _cache
+except ImportError:  # fastapi-cache2 es opcional: los endpoints se sirven sin caché
+    FastAPICache = None
+
+logger = logging.getLogger(__name__)
+
+def _request_key_builder(func: Callable, namespace: str = "", *, request=None, response=None,
+                         args: Tuple[Any, ...] = (), kwargs: Optional[Dict[str, Any]] = None) -> str:
+    """Clave por ruta y query string (el objeto Request cambia en cada petición)"""
+    if request is not None:
+        params = f"{request.url.path}?{request.url.query}"
+    else:
+        params = repr(sorted((kwargs or {}).items()))
+    return f"{FastAPICache.get_prefix()}:{namespace}:{func.__module__}:{func.__name__}:{params}"
+
+def cached(expire: int, namespace: str = "") -> Callable:
+    """
+    Cachear la respuesta de un endpoint durante `expire` segundos
+
+    Sin fastapi-cache2 instalado el endpoint queda sin decorar.
+    """
+    if FastAPICache is None:
+        return lambda func: func
+    return _cache(expire=expire, namespace=namespace, key_builder=_request_key_builder)
+
+async def init_cache(redis_url: str) -> bool:
+    """
+    Inicializar el backend de caché
+
+    Usa Redis si el cliente está instalado; si no, un backend en memoria del proceso.
+
+    Returns:
+        True si la caché quedó activa
+    """
+    if FastAPICache is None:
+        logger.info("fastapi-cache2 no disponible, respuestas sin caché")
+        return False
+
+    try:
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+        backend = RedisBackend(aioredis.from_url(redis_url))
+    except ImportError:
+        from fastapi_cache.backends.inmemory import InMemoryBackend
+        backend = InMemoryBackend()
+
+    FastAPICache.init(backend, prefix="trading-api")
+    return True
+
+async def invalidate(namespace: str) -> None:
+    """Descartar las respuestas cacheadas de un namespace"""
+    if FastAPICache is None:
+        return
+    try:
+        await FastAPICache.clear(namespace=namespace)
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la caché '{namespace}': {e}")
@@ -2,11 +2,15 @@
 Configuración del sistema AutoDev Trading Studio
 """
 
-import os
+from functools import lru_cache
+from pathlib import Path
 from typing import Optional, List
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
+# Directorios de trabajo creados al inicializar la base de datos
+WORK_DIRS = ("logs", "data", "backtest_results")
+
 class Settings(BaseSettings):
     """Configuración principal del sistema"""
     
@@ -18,6 +22,10 @@ class Settings(BaseSettings):
     # Configuración del servidor
     HOST: str = Field(default="0.0.0.0", env="HOST")
     PORT: int = Field(default=8000, env="PORT")
+    CORS_ORIGINS: List[str] = Field(
+        default=["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:5173"],
+        env="CORS_ORIGINS"
+    )  # Frontends permitidos (JSON en la variable de entorno)
     
     # Configuración de base de datos
     DATABASE_URL: str = Field(default="sqlite:///./trading_studio.db", env="DATABASE_URL")
@@ -112,10 +120,15 @@ class Settings(BaseSettings):
                 "model": "mock-llm"
             }
 
-# Instancia global de configuración
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Obtener la configuración (se construye y valida una sola vez por proceso)"""
+    return Settings()
 
-# Crear directorios necesarios
-os.makedirs("logs", exist_ok=True)
-os.makedirs("data", exist_ok=True)
-os.makedirs("backtest_results", exist_ok=True)
\ No newline at end of file
+def ensure_dirs() -> None:
+    """Crear directorios de trabajo necesarios (se llama al inicializar la base de datos)"""
+    for directory in WORK_DIRS:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+# Instancia global de configuración
+settings = get_settings()
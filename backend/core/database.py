@@ -3,28 +3,64 @@ Configuración y modelos de base de datos
 """
 
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy import create_engine, event, select, Column, Index, Integer, String, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 import logging
 
-from backend.core.config import settings
+from backend.core.config import settings, ensure_dirs
 
 logger = logging.getLogger(__name__)
 
 # Base para modelos
 Base = declarative_base()
 
+# JSON binario en PostgreSQL (sin re-parseo por lectura, indexable con GIN); JSON en el resto
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+# Escritura en lotes de actividad de agentes: filas por commit, ventana (segundos) y cola máxima
+ACTIVITY_WRITE_BATCH_SIZE = 200
+ACTIVITY_WRITE_BATCH_TIMEOUT = 0.05
+ACTIVITY_WRITE_QUEUE_SIZE = 1000
+
 # Configuración de base de datos
 if settings.DATABASE_URL.startswith("sqlite"):
     # Para SQLite, usar versión async
     DATABASE_URL = settings.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
-    engine = create_async_engine(DATABASE_URL, echo=settings.DEBUG)
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.DEBUG,
+        connect_args={"timeout": 30}  # Esperar el lock de escritura en vez de fallar
+    )
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL para que las escrituras de agentes no bloqueen a los lectores"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+        cursor.close()
+elif settings.DATABASE_URL.startswith(("postgresql://", "postgres://")):
+    # Para PostgreSQL, forzar el driver asyncpg (protocolo binario + caché de sentencias preparadas)
+    DATABASE_URL = "postgresql+asyncpg://" + settings.DATABASE_URL.split("://", 1)[1]
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.DEBUG,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        connect_args={"statement_cache_size": 1024}
+    )
 else:
-    # Para PostgreSQL u otras bases de datos
+    # Otras bases de datos (o PostgreSQL con driver explícito)
     engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
 
 # Session maker
@@ -48,10 +84,15 @@ class TradingSession(Base):
     losing_trades = Column(Integer, default=0)
     total_pnl = Column(Float, default=0.0)
     max_drawdown = Column(Float, default=0.0)
-    active_strategies = Column(JSON, default=list)
-    config = Column(JSON, default=dict)
+    active_strategies = Column(JSONType, default=list)
+    config = Column(JSONType, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Búsqueda de la sesión activa más reciente
+        Index("ix_session_status_created", "status", "created_at"),
+    )
 
 class Trade(Base):
     """Modelo para trades ejecutados"""
@@ -76,9 +117,15 @@ class Trade(Base):
     commission = Column(Float, default=0.0)
     stop_loss = Column(Float, nullable=True)
     take_profit = Column(Float, nullable=True)
-    trade_metadata = Column(JSON, default=dict)
+    trade_metadata = Column(JSONType, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Historial por símbolo/estrategia paginado con ORDER BY entry_time DESC
+        Index("ix_trades_symbol_entry", symbol, entry_time.desc()),
+        Index("ix_trades_strategy_entry", strategy, entry_time.desc()),
+    )
 
 class Strategy(Base):
     """Modelo para estrategias de trading"""
@@ -88,10 +135,10 @@ class Strategy(Base):
     name = Column(String(100), unique=True, index=True)
     description = Column(Text)
     strategy_type = Column(String(50))  # technical, ml, hybrid
-    parameters = Column(JSON, default=dict)
+    parameters = Column(JSONType, default=dict)
     is_active = Column(Boolean, default=True)
-    performance_metrics = Column(JSON, default=dict)
-    backtest_results = Column(JSON, default=dict)
+    performance_metrics = Column(JSONType, default=dict)
+    backtest_results = Column(JSONType, default=dict)
     created_by = Column(String(50), default="system")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -104,8 +151,8 @@ class AgentActivity(Base):
     agent_name = Column(String(50), index=True)
     activity_type = Column(String(50))  # analysis, trade, optimization, research
     description = Column(Text)
-    input_data = Column(JSON, default=dict)
-    output_data = Column(JSON, default=dict)
+    input_data = Column(JSONType, default=dict)
+    output_data = Column(JSONType, default=dict)
     execution_time = Column(Float)  # en segundos
     status = Column(String(20))  # success, error, timeout
     error_message = Column(Text, nullable=True)
@@ -124,8 +171,13 @@ class MarketData(Base):
     close_price = Column(Float)
     volume = Column(Float)
     timeframe = Column(String(10))  # 1m, 5m, 15m, 1h, 4h, 1d
-    indicators = Column(JSON, default=dict)  # RSI, MACD, etc.
+    indicators = Column(JSONType, default=dict)  # RSI, MACD, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Ventanas temporales por símbolo y timeframe
+        Index("ix_md_symbol_tf_ts", "symbol", "timeframe", "timestamp"),
+    )
 
 class BacktestResult(Base):
     """Modelo para resultados de backtesting"""
@@ -144,8 +196,8 @@ class BacktestResult(Base):
     max_drawdown = Column(Float, nullable=True)
     win_rate = Column(Float, nullable=True)
     total_trades = Column(Integer, default=0)
-    parameters = Column(JSON, default=dict)
-    detailed_results = Column(JSON, default=dict)
+    parameters = Column(JSONType, default=dict)
+    detailed_results = Column(JSONType, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class SystemMetrics(Base):
@@ -156,12 +208,14 @@ class SystemMetrics(Base):
     metric_name = Column(String(100), index=True)
     metric_value = Column(Float)
     metric_type = Column(String(50))  # counter, gauge, histogram
-    labels = Column(JSON, default=dict)
+    labels = Column(JSONType, default=dict)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 async def init_db():
     """Inicializar base de datos y crear tablas"""
     try:
+        ensure_dirs()
+        
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
         logger.info("✅ Base de datos inicializada correctamente")
@@ -177,42 +231,154 @@ async def get_db() -> AsyncSession:
         finally:
             await session.close()
 
+class BatchWriter:
+    """Agrupar filas ORM en segundo plano e insertarlas con un único commit por lote"""
+    
+    def __init__(self, batch_size: int, batch_timeout: float, maxsize: int):
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task] = None
+    
+    async def put(self, row: Base):
+        """Encolar una fila; arranca el volcado en segundo plano si no está activo"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await self.queue.put(row)
+    
+    async def close(self):
+        """Volcar lo pendiente y detener el volcado en segundo plano"""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        """Drenar la cola en lotes de hasta batch_size filas o batch_timeout segundos"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            
+            deadline = loop.time() + self.batch_timeout
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def _write(self, batch: List[Base]):
+        """Insertar un lote; si falla, reintentar fila a fila para no perder las válidas"""
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all(batch)
+                await db.commit()
+            return
+        except Exception as e:
+            logger.error(f"Error registrando lote de {len(batch)} filas, reintentando una a una: {e}")
+        
+        dropped = 0
+        for row in batch:
+            try:
+                async with AsyncSessionLocal() as db:
+                    db.add(row)
+                    await db.commit()
+            except Exception as e:
+                dropped += 1
+                logger.error(f"Error registrando fila {type(row).__name__}: {e}")
+        if dropped:
+            logger.error(f"Se descartaron {dropped} de {len(batch)} filas del lote")
+
+_activity_writer = BatchWriter(ACTIVITY_WRITE_BATCH_SIZE, ACTIVITY_WRITE_BATCH_TIMEOUT, ACTIVITY_WRITE_QUEUE_SIZE)
+
+@asynccontextmanager
+async def _session_scope(db: Optional[AsyncSession] = None):
+    """
+    Sesión para una operación de DatabaseManager
+    
+    Con `db` (p. ej. la de get_db) se reutiliza esa sesión y sólo se hace flush: el commit
+    queda a cargo del llamador, que puede agrupar varias escrituras en una transacción.
+    Sin `db` se abre una sesión propia que hace commit al salir.
+    """
+    if db is not None:
+        yield db
+        await db.flush()
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
+        await session.commit()
+
 class DatabaseManager:
     """Manager para operaciones de base de datos"""
     
     @staticmethod
-    async def create_trading_session(session_data: Dict[str, Any]) -> TradingSession:
+    async def create_trading_session(session_data: Dict[str, Any],
+                                     db: Optional[AsyncSession] = None) -> TradingSession:
         """Crear nueva sesión de trading"""
-        async with AsyncSessionLocal() as db:
+        async with _session_scope(db) as db:
             session = TradingSession(**session_data)
             db.add(session)
-            await db.commit()
-            await db.refresh(session)
-            return session
+        return session
     
     @staticmethod
-    async def get_active_trading_session() -> Optional[TradingSession]:
+    async def get_active_trading_session(db: Optional[AsyncSession] = None) -> Optional[TradingSession]:
         """Obtener sesión de trading activa"""
-        async with AsyncSessionLocal() as db:
-            result = await db.execute(
-                "SELECT * FROM trading_sessions WHERE status = 'active' ORDER BY created_at DESC LIMIT 1"
+        async with _session_scope(db) as db:
+            stmt = (
+                select(TradingSession)
+                .where(TradingSession.status == "active")
+                .order_by(TradingSession.created_at.desc())
+                .limit(1)
             )
-            return result.first()
+            result = await db.execute(stmt)
+            return result.scalar_one_or_none()
     
     @staticmethod
-    async def record_trade(trade_data: Dict[str, Any]) -> Trade:
+    async def record_trade(trade_data: Dict[str, Any], db: Optional[AsyncSession] = None) -> Trade:
         """Registrar un trade"""
-        async with AsyncSessionLocal() as db:
+        async with _session_scope(db) as db:
             trade = Trade(**trade_data)
             db.add(trade)
-            await db.commit()
-            await db.refresh(trade)
-            return trade
+        return trade
+    
+    @staticmethod
+    async def record_trades_bulk(trades_data: List[Dict[str, Any]],
+                                 db: Optional[AsyncSession] = None) -> List[Trade]:
+        """Registrar varios trades en una sola transacción (INSERT multi-fila)"""
+        async with _session_scope(db) as db:
+            trades = [Trade(**trade_data) for trade_data in trades_data]
+            db.add_all(trades)
+        return trades
+    
+    @staticmethod
+    async def get_closed_trade_pnls(since: datetime, db: Optional[AsyncSession] = None) -> List[float]:
+        """Obtener el PnL de los trades cerrados desde `since`, en orden de cierre"""
+        async with _session_scope(db) as db:
+            stmt = (
+                select(Trade.pnl)
+                .where(Trade.exit_time.is_not(None), Trade.exit_time >= since, Trade.pnl.is_not(None))
+                .order_by(Trade.exit_time)
+            )
+            result = await db.execute(stmt)
+            return list(result.scalars())
     
     @staticmethod
-    async def get_strategy_performance(strategy_name: str) -> Dict[str, Any]:
+    async def get_strategy_performance(strategy_name: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
         """Obtener métricas de performance de una estrategia"""
-        async with AsyncSessionLocal() as db:
+        async with _session_scope(db) as db:
             # Implementar consulta de performance
             # Por ahora retornar datos mock
             return {
@@ -224,10 +390,12 @@ class DatabaseManager:
     
     @staticmethod
     async def log_agent_activity(activity_data: Dict[str, Any]) -> AgentActivity:
-        """Registrar actividad de agente"""
-        async with AsyncSessionLocal() as db:
-            activity = AgentActivity(**activity_data)
-            db.add(activity)
-            await db.commit()
-            await db.refresh(activity)
-            return activity
\ No newline at end of file
+        """Registrar actividad de agente (se inserta en el próximo lote; sin id hasta entonces)"""
+        activity = AgentActivity(**activity_data)
+        await _activity_writer.put(activity)
+        return activity
+    
+    @staticmethod
+    async def flush_agent_activity():
+        """Volcar la actividad pendiente de agentes (llamar al apagar el sistema)"""
+        await _activity_writer.close()
\ No newline at end of file
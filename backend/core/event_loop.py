@@ -0,0 +1,45 @@
+"""
+Selección del event loop del proceso
+"""
+
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+def install_uvloop() -> bool:
+    """
+    Instalar uvloop como política de event loop del proceso
+    
+    Debe llamarse en el punto de entrada, antes de crear el event loop.
+    
+    Returns:
+        True si uvloop quedó instalado; False si se usa el loop estándar de asyncio
+        (Windows o uvloop no disponible)
+    """
+    if sys.platform.startswith("win"):
+        return False
+    
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop no disponible, usando event loop estándar de asyncio")
+        return False
+    
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+def select_http_protocol() -> str:
+    """
+    Elegir la implementación HTTP de uvicorn
+    
+    Returns:
+        "httptools" (parser en C incluido en uvicorn[standard]) si está instalado,
+        "h11" en caso contrario
+    """
+    try:
+        import httptools  # noqa: F401
+    except ImportError:
+        return "h11"
+    return "httptools"
@@ -2,14 +2,149 @@
 Configuración de logging para AutoDev Trading Studio
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
 from backend.core.config import settings
 
+# Buffer del archivo de log: se escribe al juntar estos bytes o tras este intervalo (segundos)
+LOG_BUFFER_BYTES = 64 * 1024
+LOG_FLUSH_INTERVAL = 0.1
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter que reutiliza el asctime mientras no cambie el segundo"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_asctime = ""
+    
+    def formatTime(self, record, datefmt=None):
+        # Sin datefmt el formato por defecto incluye milisegundos: no se puede cachear por segundo
+        if datefmt is None:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_asctime = super().formatTime(record, datefmt)
+            self._last_second = second
+        return self._last_asctime
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler que agrupa registros y los escribe en bloque (un write por lote)
+    
+    El lote se escribe al juntar buffer_bytes, al llegar un registro de nivel
+    flush_level o superior, o cuando el registro más antiguo del lote supera
+    flush_interval. La cola que queda cuando el log se detiene la escribe
+    FlushingQueueListener al quedar ocioso.
+    """
+    
+    def __init__(self, *args, buffer_bytes: int = LOG_BUFFER_BYTES,
+                 flush_interval: float = LOG_FLUSH_INTERVAL,
+                 flush_level: int = logging.ERROR, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer = []
+        self._buffered = 0
+        self._first_created = 0.0
+    
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        
+        if not self._buffer:
+            self._first_created = record.created
+        self._buffer.append(msg)
+        self._buffered += len(msg)
+        if (self._buffered >= self.buffer_bytes
+                or record.levelno >= self.flush_level
+                or record.created - self._first_created >= self.flush_interval):
+            self._write_buffer()
+    
+    def flush(self):
+        self.acquire()
+        try:
+            self._write_buffer()
+            super().flush()
+        finally:
+            self.release()
+    
+    def close(self):
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+        super().close()
+    
+    def _write_buffer(self):
+        """Escribir el lote pendiente, rotando antes si supera maxBytes (llamar con el lock tomado)"""
+        if not self._buffer:
+            return
+        
+        data = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() > 0 and self.stream.tell() + len(data) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(data)
+            self.stream.flush()
+        except Exception:
+            self.handleError(None)
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener que vacía los buffers de sus handlers cuando la cola queda ociosa"""
+    
+    def __init__(self, log_queue, *handlers, flush_interval: float = LOG_FLUSH_INTERVAL, **kwargs):
+        super().__init__(log_queue, *handlers, **kwargs)
+        self.flush_interval = flush_interval
+    
+    def dequeue(self, block):
+        if not block:
+            return self.queue.get(block)
+        try:
+            return self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            # Sin registros nuevos en la ventana: escribir lo pendiente y esperar al siguiente
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get()
+
+# Niveles por componente aplicados en configure_specific_loggers
+_LOGGER_LEVELS = (
+    # Reducir verbosidad de librerías externas
+    ("urllib3", logging.WARNING),
+    ("requests", logging.WARNING),
+    ("aiohttp", logging.WARNING),
+    ("websockets", logging.WARNING),
+    ("asyncio", logging.WARNING),
+    # Trading, agentes y backtesting
+    ("trading", logging.INFO),
+    ("agents", logging.INFO),
+    ("backtesting", logging.INFO),
+)
+
+# El directorio de LOG_FILE ya fue creado en este proceso
+_log_dir_ready = False
+
+# Listener que escribe en consola/archivo los registros encolados por el QueueHandler raíz
+_listener: Optional[logging.handlers.QueueListener] = None
+
 def setup_logging(log_level: Optional[str] = None) -> None:
     """
     Configurar el sistema de logging
@@ -18,82 +153,87 @@ def setup_logging(log_level: Optional[str] = None) -> None:
         log_level: Nivel de logging (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     """
     
+    # Ningún formato usa hilo/proceso/tarea: no capturarlos en cada LogRecord
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False  # Python 3.12+
+    
     # Usar nivel de configuración si no se especifica
     if log_level is None:
         log_level = settings.LOG_LEVEL
     
-    # Crear directorio de logs si no existe
-    log_dir = os.path.dirname(settings.LOG_FILE)
-    if log_dir:
-        os.makedirs(log_dir, exist_ok=True)
+    # Crear directorio de logs si no existe (una vez por proceso)
+    global _log_dir_ready
+    if not _log_dir_ready:
+        log_dir = os.path.dirname(settings.LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        _log_dir_ready = True
     
-    # Configurar formato de logging
-    log_format = (
+    # Configurar formato de logging (función/línea sólo en el archivo, que registra DEBUG)
+    console_format = "%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s"
+    file_format = (
         "%(asctime)s | %(levelname)-8s | %(name)-20s | "
         "%(funcName)-15s:%(lineno)-3d | %(message)s"
     )
     
     date_format = "%Y-%m-%d %H:%M:%S"
+    level = getattr(logging, log_level.upper())
     
-    # Configurar logging básico
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper()),
-        format=log_format,
-        datefmt=date_format,
-        handlers=[]
-    )
-    
-    # Obtener logger raíz
+    # Configurar logger raíz (reemplaza cualquier configuración previa)
     root_logger = logging.getLogger()
-    root_logger.handlers.clear()
+    root_logger.setLevel(level)
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    stop_logging()
     
     # Handler para consola
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(getattr(logging, log_level.upper()))
-    console_formatter = logging.Formatter(log_format, date_format)
-    console_handler.setFormatter(console_formatter)
-    root_logger.addHandler(console_handler)
+    console_handler.setLevel(level)
+    console_handler.setFormatter(CachedTimeFormatter(console_format, date_format))
     
     # Handler para archivo con rotación
-    file_handler = logging.handlers.RotatingFileHandler(
+    file_handler = BufferedRotatingFileHandler(
         settings.LOG_FILE,
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,
         encoding='utf-8'
     )
     file_handler.setLevel(logging.DEBUG)  # Archivo siempre en DEBUG
-    file_formatter = logging.Formatter(log_format, date_format)
-    file_handler.setFormatter(file_formatter)
-    root_logger.addHandler(file_handler)
+    file_handler.setFormatter(CachedTimeFormatter(file_format, date_format))
+    
+    # Quien emite sólo encola el registro; formato y escritura corren en el hilo del listener
+    global _listener
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = FlushingQueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
     
     # Configurar loggers específicos
     configure_specific_loggers()
     
     # Log inicial
     logger = logging.getLogger(__name__)
-    logger.info(f"Sistema de logging configurado - Nivel: {log_level}")
+    logger.info("Sistema de logging configurado - Nivel: %s", log_level)
+
+def stop_logging() -> None:
+    """Detener el listener de logging volcando los registros pendientes"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+
+atexit.register(stop_logging)
 
 def configure_specific_loggers():
     """Configurar loggers específicos para diferentes componentes"""
-    
-    # Reducir verbosidad de librerías externas
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
-    logging.getLogger("aiohttp").setLevel(logging.WARNING)
-    logging.getLogger("websockets").setLevel(logging.WARNING)
-    logging.getLogger("asyncio").setLevel(logging.WARNING)
-    
-    # Configurar loggers de trading
-    trading_logger = logging.getLogger("trading")
-    trading_logger.setLevel(logging.INFO)
-    
-    # Configurar loggers de agentes
-    agents_logger = logging.getLogger("agents")
-    agents_logger.setLevel(logging.INFO)
-    
-    # Configurar logger de backtesting
-    backtest_logger = logging.getLogger("backtesting")
-    backtest_logger.setLevel(logging.INFO)
+    for name, level in _LOGGER_LEVELS:
+        logging.getLogger(name).setLevel(level)
 
 def get_logger(name: str) -> logging.Logger:
     """
@@ -110,20 +250,30 @@ def get_logger(name: str) -> logging.Logger:
 class TradingLoggerAdapter(logging.LoggerAdapter):
     """Adapter para agregar contexto de trading a los logs"""
     
-    def process(self, msg, kwargs):
-        """Procesar mensaje agregando contexto"""
+    def __init__(self, logger, extra=None):
+        super().__init__(logger, extra)
+        # El contexto no cambia tras crear el adapter: formatear el prefijo una sola vez
         context = self.extra
-        
         if context:
-            context_str = " | ".join([f"{k}={v}" for k, v in context.items()])
-            return f"[{context_str}] {msg}", kwargs
+            context_str = " | ".join(f"{k}={v}" for k, v in context.items())
+            self._prefix = f"[{context_str}] "
+        else:
+            self._prefix = ""
+    
+    def process(self, msg, kwargs):
+        """Procesar mensaje agregando contexto"""
+        if self._prefix:
+            return f"{self._prefix}{msg}", kwargs
         
         return msg, kwargs
 
+@lru_cache(maxsize=512)
 def get_trading_logger(symbol: str = None, strategy: str = None, agent: str = None) -> TradingLoggerAdapter:
     """
     Obtener logger específico para trading con contexto
     
+    Se reutiliza el mismo adapter para cada combinación de contexto.
+    
     Args:
         symbol: Símbolo de trading (ej: BTCUSDT)
         strategy: Nombre de la estrategia
@@ -143,7 +293,3 @@ def get_trading_logger(symbol: str = None, strategy: str = None, agent: str = No
         context["agent"] = agent
     
     return TradingLoggerAdapter(base_logger, context)
-
-# Configurar logging al importar el módulo
-if not logging.getLogger().handlers:
-    setup_logging()
\ No newline at end of file
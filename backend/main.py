@@ -5,28 +5,47 @@ Sistema de trading autónomo con agentes IA especializados
 
 import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Dict, Any
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 
+from backend.core.cache import init_cache
 from backend.core.config import settings
-from backend.core.database import init_db
-from backend.core.logging_config import setup_logging
+from backend.core.database import DatabaseManager, init_db
+from backend.core.event_loop import install_uvloop, select_http_protocol
+from backend.core.logging_config import setup_logging, stop_logging
 from backend.agents.agent_manager import AgentManager
 from backend.api.routes import trading
 from backend.services.websocket_manager import WebSocketManager
 from backend.services.binance_service import BinanceService
 from backend.services.llm_service import LLMService
+from backend.services import metrics
 from backend.services.risk_manager import RiskManager
 
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:  # orjson es opcional: serializar con json estándar
+    DefaultResponse = JSONResponse
+
 # Configurar logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Eco de WebSocket: ventana de agrupación (segundos), mensajes por envío y cola máxima por cliente
+WS_ECHO_FLUSH_INTERVAL = 0.005
+WS_ECHO_BATCH_SIZE = 256
+WS_ECHO_QUEUE_SIZE = 1024
+
+# Estado fijo de servicios reportado por /api/health
+_STATIC_SERVICES_STATUS = {"database": "connected", "binance_testnet": "connected"}
+
 # Managers y servicios globales
 agent_manager: AgentManager = None
 websocket_manager: WebSocketManager = None
@@ -46,25 +65,48 @@ async def lifespan(app: FastAPI):
         await init_db()
         logger.info("✅ Base de datos inicializada")
         
+        if await init_cache(settings.REDIS_URL):
+            logger.info("✅ Caché de respuestas inicializada")
+        
+        trading.warm_up_models()
+        metrics.warm_up()
+        
         # Inicializar servicios
         websocket_manager = WebSocketManager()
+        app.state.websocket_manager = websocket_manager
         logger.info("✅ WebSocket Manager inicializado")
         
+        # Servicios independientes entre sí: inicializarlos en paralelo
         binance_service = BinanceService()
-        await binance_service.initialize()
-        logger.info("✅ Binance Service inicializado")
-        
         llm_service = LLMService()
-        await llm_service.initialize()
-        logger.info("✅ LLM Service inicializado")
-        
         risk_manager = RiskManager()
-        await risk_manager.initialize()
-        logger.info("✅ Risk Manager inicializado")
+        services = {
+            "Binance Service": binance_service,
+            "LLM Service": llm_service,
+            "Risk Manager": risk_manager,
+        }
+        results = await asyncio.gather(
+            *(service.initialize() for service in services.values()),
+            return_exceptions=True
+        )
+        errors = []
+        for name, result in zip(services, results):
+            if isinstance(result, BaseException):
+                logger.error("❌ Error inicializando %s: %s", name, result)
+                errors.append(result)
+            else:
+                logger.info("✅ %s inicializado", name)
+        if errors:
+            raise errors[0]
+        
+        app.state.binance_service = binance_service
+        app.state.llm_service = llm_service
+        app.state.risk_manager = risk_manager
         
         # Inicializar agentes IA (último)
         agent_manager = AgentManager()
         await agent_manager.initialize()
+        app.state.agent_manager = agent_manager
         logger.info("✅ Agent Manager inicializado")
         
         # Iniciar servicios en background
@@ -76,7 +118,7 @@ async def lifespan(app: FastAPI):
         yield
         
     except Exception as e:
-        logger.error(f"❌ Error durante el inicio: {e}")
+        logger.error("❌ Error durante el inicio: %s", e)
         raise
     finally:
         # Cleanup
@@ -85,6 +127,8 @@ async def lifespan(app: FastAPI):
         if agent_manager:
             await agent_manager.shutdown()
         
+        await DatabaseManager.flush_agent_activity()
+        
         if websocket_manager:
             await websocket_manager.shutdown()
         
@@ -92,24 +136,35 @@ async def lifespan(app: FastAPI):
             await binance_service.close()
         
         logger.info("✅ Sistema cerrado correctamente")
+        stop_logging()
 
 # Crear aplicación FastAPI
 app = FastAPI(
     title="AutoDev Trading Studio",
     description="Sistema de trading autónomo con agentes IA especializados",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Payloads de portafolio/posiciones pueden ser grandes: serializarlos con orjson si está disponible
+    default_response_class=DefaultResponse
 )
 
-# Configurar CORS
+# Configurar CORS (los scopes que no son HTTP, como /ws, pasan sin procesar)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # En producción, especificar dominios exactos
+    allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_timestamp(request: Request, call_next):
+    """Fijar la hora de la petición una sola vez para que los endpoints la reutilicen"""
+    now = datetime.utcnow()
+    request.state.now = now
+    request.state.now_iso = now.isoformat()
+    return await call_next(request)
+
 # Incluir rutas
 app.include_router(trading.router, prefix="/api/trading", tags=["trading"])
 
@@ -134,10 +189,9 @@ async def health_check():
     try:
         health_status = {
             "status": "healthy",
-            "timestamp": asyncio.get_event_loop().time(),
+            "timestamp": time.monotonic(),
             "services": {
-                "database": "connected",
-                "binance_testnet": "connected",
+                **_STATIC_SERVICES_STATUS,
                 "agents": "active" if agent_manager and agent_manager.is_running else "inactive"
             }
         }
@@ -147,66 +201,69 @@ async def health_check():
             
         return health_status
     except Exception as e:
-        logger.error(f"Error en health check: {e}")
+        logger.error("Error en health check: %s", e)
         raise HTTPException(status_code=500, detail="Sistema no disponible")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket para comunicación en tiempo real"""
     await websocket_manager.connect(websocket)
+    # Cola acotada: si el cliente no consume los ecos, la recepción espera (backpressure)
+    pending: asyncio.Queue = asyncio.Queue(maxsize=WS_ECHO_QUEUE_SIZE)
+    flusher = asyncio.create_task(_flush_echoes(websocket, pending))
+    flusher.add_done_callback(lambda task: _on_flusher_done(task, websocket))
     try:
         while True:
             # Mantener conexión activa
             data = await websocket.receive_text()
-            # Procesar mensajes del cliente si es necesario
-            await websocket_manager.send_personal_message(f"Echo: {data}", websocket)
+            # Procesar mensajes del cliente si es necesario (el eco se envía en lotes)
+            await pending.put("Echo: " + data)
     except WebSocketDisconnect:
+        pass
+    finally:
+        flusher.cancel()
+        websocket_manager.disconnect(websocket)
+
+async def _flush_echoes(websocket: WebSocket, pending: asyncio.Queue):
+    """Enviar los ecos pendientes por ventana de WS_ECHO_FLUSH_INTERVAL (un frame por eco)"""
+    while True:
+        batch = [await pending.get()]
+        await asyncio.sleep(WS_ECHO_FLUSH_INTERVAL)
+        while len(batch) < WS_ECHO_BATCH_SIZE and not pending.empty():
+            batch.append(pending.get_nowait())
+        for message in batch:
+            await websocket_manager.send_personal_message(message, websocket)
+
+def _on_flusher_done(task: asyncio.Task, websocket: WebSocket):
+    """Si el envío de ecos falla, registrar el error y desconectar al cliente"""
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error("Error enviando ecos de WebSocket: %s", exc)
         websocket_manager.disconnect(websocket)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Manejador global de excepciones"""
-    logger.error(f"Error no manejado: {exc}", exc_info=True)
-    return JSONResponse(
+    logger.error("Error no manejado: %s", exc, exc_info=True)
+    return DefaultResponse(
         status_code=500,
         content={"detail": "Error interno del servidor"}
     )
 
-def get_agent_manager() -> AgentManager:
-    """Obtener instancia del manager de agentes"""
-    if not agent_manager:
-        raise HTTPException(status_code=503, detail="Agent Manager no inicializado")
-    return agent_manager
-
-def get_websocket_manager() -> WebSocketManager:
-    """Obtener instancia del manager de WebSocket"""
-    if not websocket_manager:
-        raise HTTPException(status_code=503, detail="WebSocket Manager no inicializado")
-    return websocket_manager
-
-def get_binance_service() -> BinanceService:
-    """Obtener instancia del servicio de Binance"""
-    if not binance_service:
-        raise HTTPException(status_code=503, detail="Binance Service no inicializado")
-    return binance_service
-
-def get_llm_service() -> LLMService:
-    """Obtener instancia del servicio LLM"""
-    if not llm_service:
-        raise HTTPException(status_code=503, detail="LLM Service no inicializado")
-    return llm_service
-
-def get_risk_manager() -> RiskManager:
-    """Obtener instancia del gestor de riesgo"""
-    if not risk_manager:
-        raise HTTPException(status_code=503, detail="Risk Manager no inicializado")
-    return risk_manager
-
 if __name__ == "__main__":
+    # uvloop y httptools reducen el overhead de cada await y del parseo HTTP (fallback a asyncio/h11)
+    loop = "uvloop" if install_uvloop() else "asyncio"
+    http = select_http_protocol()
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        reload=settings.DEBUG,
+        log_level="info",
+        log_config=None,  # Mantener la configuración de setup_logging (QueueHandler)
+        loop=loop,
+        http=http
     )
\ No newline at end of file
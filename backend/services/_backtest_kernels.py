@@ -0,0 +1,352 @@
+"""
+Kernels numéricos del servicio de backtesting (compilados con numba si está disponible)
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba es opcional: se usan las versiones pandas/Python
+    njit = None
+    prange = range
+
+# Códigos de salida de un trade (índices de EXIT_REASONS)
+EXIT_RSI_OVERBOUGHT = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_MACD_SIGNAL = 3
+EXIT_MA_CROSSOVER = 4
+EXIT_BB_MIDDLE = 5
+EXIT_REASONS = ("RSI_OVERBOUGHT", "STOP_LOSS", "TAKE_PROFIT", "MACD_SIGNAL", "MA_CROSSOVER", "BB_MIDDLE")
+
+# Fracción del capital que se invierte al abrir una posición
+POSITION_FRACTION = 0.95
+
+# Columnas de la matriz devuelta por compute_indicators
+IND_RSI = 0
+IND_EMA_FAST = 1
+IND_EMA_SLOW = 2
+IND_MACD = 3
+IND_MACD_SIGNAL = 4
+IND_BB_MID = 5
+IND_BB_STD = 6
+N_INDICATORS = 7
+
+def compute_indicators_loop(close: np.ndarray, rsi_period: int, fast: int, slow: int, signal: int,
+                            bb_period: int) -> np.ndarray:
+    """
+    Calcular RSI, EMAs, MACD y media/desviación de Bollinger en una sola pasada
+
+    Reproduce la librería ta: RSI con suavizado de Wilder, EMAs con alpha=2/(n+1),
+    desviación poblacional y NaN hasta completar cada ventana.
+
+    Returns:
+        Matriz (n, N_INDICATORS) indexada con las constantes IND_*
+    """
+    n = close.size
+    out = np.full((n, N_INDICATORS), np.nan)
+    if n == 0:
+        return out
+
+    alpha_rsi = 1.0 / rsi_period
+    alpha_fast = 2.0 / (fast + 1)
+    alpha_slow = 2.0 / (slow + 1)
+    alpha_signal = 2.0 / (signal + 1)
+    macd_start = max(fast, slow) - 1
+
+    avg_gain = 0.0
+    avg_loss = 0.0
+    ema_fast = close[0]
+    ema_slow = close[0]
+    macd_signal = 0.0
+
+    # Media y suma de cuadrados centrada de la ventana de Bollinger (Welford deslizante)
+    win_mean = 0.0
+    win_m2 = 0.0
+
+    for i in range(n):
+        price = close[i]
+
+        # RSI: la primera vela no tiene variación y cuenta como ganancia/pérdida cero
+        gain = 0.0
+        loss = 0.0
+        if i > 0:
+            delta = price - close[i - 1]
+            if delta > 0:
+                gain = delta
+            elif delta < 0:
+                loss = -delta
+        avg_gain = (1 - alpha_rsi) * avg_gain + alpha_rsi * gain
+        avg_loss = (1 - alpha_rsi) * avg_loss + alpha_rsi * loss
+        if i >= rsi_period - 1:
+            out[i, IND_RSI] = 100.0 if avg_loss == 0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        # EMAs y MACD; la señal arranca con el primer valor válido del MACD
+        if i > 0:
+            ema_fast = (1 - alpha_fast) * ema_fast + alpha_fast * price
+            ema_slow = (1 - alpha_slow) * ema_slow + alpha_slow * price
+        if i >= fast - 1:
+            out[i, IND_EMA_FAST] = ema_fast
+        if i >= slow - 1:
+            out[i, IND_EMA_SLOW] = ema_slow
+        if i >= macd_start:
+            macd = ema_fast - ema_slow
+            out[i, IND_MACD] = macd
+            if i == macd_start:
+                macd_signal = macd
+            else:
+                macd_signal = (1 - alpha_signal) * macd_signal + alpha_signal * macd
+            if i >= macd_start + signal - 1:
+                out[i, IND_MACD_SIGNAL] = macd_signal
+
+        # Bollinger: media y desviación estándar (ddof=0) de la ventana deslizante
+        if i < bb_period:
+            prev_mean = win_mean
+            win_mean += (price - prev_mean) / (i + 1)
+            win_m2 += (price - prev_mean) * (price - win_mean)
+        else:
+            old = close[i - bb_period]
+            prev_mean = win_mean
+            win_mean += (price - old) / bb_period
+            win_m2 += (price - old) * (price - win_mean + old - prev_mean)
+        if i >= bb_period - 1:
+            variance = win_m2 / bb_period
+            out[i, IND_BB_MID] = win_mean
+            out[i, IND_BB_STD] = np.sqrt(variance) if variance > 0 else 0.0
+
+    return out
+
+def rsi_strategy_loop(close: np.ndarray, rsi: np.ndarray, oversold: float, overbought: float,
+                      sl: float, tp: float, init_cap: float):
+    """
+    Simular la estrategia RSI vela a vela
+
+    Returns:
+        (entry_idx, exit_idx, entry_px, exit_px, qty, pnl, exit_reason, equity_curve);
+        los arrays de trades tienen un elemento por trade cerrado
+    """
+    n = len(close)
+    entry_idx = np.empty(n, dtype=np.int64)
+    exit_idx = np.empty(n, dtype=np.int64)
+    entry_px = np.empty(n, dtype=np.float64)
+    exit_px = np.empty(n, dtype=np.float64)
+    qty = np.empty(n, dtype=np.float64)
+    pnl = np.empty(n, dtype=np.float64)
+    exit_reason = np.empty(n, dtype=np.int8)
+    equity = np.empty(n, dtype=np.float64)
+    if n > 0:
+        equity[0] = init_cap
+
+    capital = init_cap
+    count = 0
+    in_position = False
+    open_idx = 0
+    open_px = 0.0
+    open_qty = 0.0
+    stop_price = 0.0
+    take_price = 0.0
+
+    for i in range(1, n):
+        price = close[i]
+        current_rsi = rsi[i]
+
+        # NaN < oversold es False: las velas sin RSI no abren posición
+        if not in_position:
+            if current_rsi < oversold:
+                in_position = True
+                open_idx = i
+                open_px = price
+                open_qty = capital * POSITION_FRACTION / price
+                stop_price = price * (1 - sl)
+                take_price = price * (1 + tp)
+        else:
+            code = -1
+            if current_rsi > overbought:
+                code = EXIT_RSI_OVERBOUGHT
+            elif price <= stop_price:
+                code = EXIT_STOP_LOSS
+            elif price >= take_price:
+                code = EXIT_TAKE_PROFIT
+
+            if code >= 0:
+                trade_pnl = (price - open_px) * open_qty
+                capital += trade_pnl
+                entry_idx[count] = open_idx
+                exit_idx[count] = i
+                entry_px[count] = open_px
+                exit_px[count] = price
+                qty[count] = open_qty
+                pnl[count] = trade_pnl
+                exit_reason[count] = code
+                count += 1
+                in_position = False
+
+        equity[i] = capital
+
+    return (entry_idx[:count], exit_idx[:count], entry_px[:count], exit_px[:count],
+            qty[:count], pnl[:count], exit_reason[:count], equity)
+
+def compute_indicators_vectorized(close: np.ndarray, rsi_period: int, fast: int, slow: int, signal: int,
+                                  bb_period: int) -> np.ndarray:
+    """Mismos indicadores que compute_indicators_loop con las rutinas de pandas (sin numba)"""
+    out = np.full((close.size, N_INDICATORS), np.nan)
+    series = pd.Series(close)
+    
+    delta = np.diff(close, prepend=close[:1])
+    avg_gain = pd.Series(np.maximum(delta, 0.0)).ewm(alpha=1.0 / rsi_period, min_periods=rsi_period, adjust=False).mean()
+    avg_loss = pd.Series(np.maximum(-delta, 0.0)).ewm(alpha=1.0 / rsi_period, min_periods=rsi_period, adjust=False).mean()
+    avg_gain = avg_gain.to_numpy()
+    avg_loss = avg_loss.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, IND_RSI] = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    
+    ema_fast = series.ewm(span=fast, min_periods=fast, adjust=False).mean()
+    ema_slow = series.ewm(span=slow, min_periods=slow, adjust=False).mean()
+    macd = ema_fast - ema_slow
+    out[:, IND_EMA_FAST] = ema_fast.to_numpy()
+    out[:, IND_EMA_SLOW] = ema_slow.to_numpy()
+    out[:, IND_MACD] = macd.to_numpy()
+    out[:, IND_MACD_SIGNAL] = macd.ewm(span=signal, min_periods=signal, adjust=False).mean().to_numpy()
+    
+    window = series.rolling(bb_period, min_periods=bb_period)
+    out[:, IND_BB_MID] = window.mean().to_numpy()
+    out[:, IND_BB_STD] = window.std(ddof=0).to_numpy()
+    return out
+
+def rsi_sweep_loop(close: np.ndarray, rsi_rows: np.ndarray, row_idx: np.ndarray, oversold: np.ndarray,
+                   overbought: np.ndarray, sl: np.ndarray, tp: np.ndarray, init_cap: float):
+    """
+    Estrategia RSI para una malla de parámetros (en paralelo sobre los juegos de parámetros)
+
+    Args:
+        rsi_rows: Una serie de RSI por período distinto
+        row_idx: Fila de rsi_rows que usa cada juego de parámetros
+
+    Returns:
+        (total_pnl, n_trades, final_equity), un elemento por juego de parámetros
+    """
+    n_params = len(row_idx)
+    n = len(close)
+    total_pnl = np.zeros(n_params, dtype=np.float64)
+    n_trades = np.zeros(n_params, dtype=np.int64)
+    final_equity = np.empty(n_params, dtype=np.float64)
+
+    for p in prange(n_params):
+        rsi = rsi_rows[row_idx[p]]
+        capital = init_cap
+        pnl_sum = 0.0
+        trades = 0
+        in_position = False
+        open_px = 0.0
+        open_qty = 0.0
+        stop_price = 0.0
+        take_price = 0.0
+
+        # Mismas reglas que rsi_strategy_loop, acumulando solo los totales
+        for i in range(1, n):
+            price = close[i]
+            current_rsi = rsi[i]
+            if not in_position:
+                if current_rsi < oversold[p]:
+                    in_position = True
+                    open_px = price
+                    open_qty = capital * POSITION_FRACTION / price
+                    stop_price = price * (1 - sl[p])
+                    take_price = price * (1 + tp[p])
+            elif current_rsi > overbought[p] or price <= stop_price or price >= take_price:
+                trade_pnl = (price - open_px) * open_qty
+                capital += trade_pnl
+                pnl_sum += trade_pnl
+                trades += 1
+                in_position = False
+
+        total_pnl[p] = pnl_sum
+        n_trades[p] = trades
+        final_equity[p] = capital
+
+    return total_pnl, n_trades, final_equity
+
+def trade_stats_loop(pnl: np.ndarray, durations: np.ndarray):
+    """
+    Estadísticas de los trades cerrados en una sola pasada
+
+    Returns:
+        (total_pnl, wins, losses, gross_profit, gross_loss, largest_win, largest_loss, total_duration);
+        largest_win/largest_loss son el máximo y el mínimo del PnL de todos los trades
+    """
+    n = len(pnl)
+    total_pnl = 0.0
+    wins = 0
+    losses = 0
+    gross_profit = 0.0
+    gross_loss = 0.0
+    largest_win = pnl[0] if n > 0 else 0.0
+    largest_loss = largest_win
+    total_duration = 0.0
+
+    for k in range(n):
+        trade_pnl = pnl[k]
+        total_pnl += trade_pnl
+        total_duration += durations[k]
+        if trade_pnl > 0:
+            wins += 1
+            gross_profit += trade_pnl
+        elif trade_pnl < 0:
+            losses += 1
+            gross_loss -= trade_pnl
+        if trade_pnl > largest_win:
+            largest_win = trade_pnl
+        if trade_pnl < largest_loss:
+            largest_loss = trade_pnl
+
+    return total_pnl, wins, losses, gross_profit, gross_loss, largest_win, largest_loss, total_duration
+
+def rsi_strategy_lists(close: np.ndarray, rsi: np.ndarray, oversold: float, overbought: float,
+                       sl: float, tp: float, init_cap: float):
+    """rsi_strategy_loop sobre listas de floats nativos (sin numba, indexarlas cuesta menos que un ndarray)"""
+    return rsi_strategy_loop(close.tolist(), rsi.tolist(), oversold, overbought, sl, tp, init_cap)
+
+def trade_stats_lists(pnl: np.ndarray, durations: np.ndarray):
+    """trade_stats_loop sobre listas de floats nativos (sin numba)"""
+    return trade_stats_loop(pnl.tolist(), durations.tolist())
+
+def rsi_sweep_lists(close: np.ndarray, rsi_rows: np.ndarray, row_idx: np.ndarray, oversold: np.ndarray,
+                    overbought: np.ndarray, sl: np.ndarray, tp: np.ndarray, init_cap: float):
+    """rsi_sweep_loop sobre listas de floats nativos (sin numba)"""
+    return rsi_sweep_loop(close.tolist(), rsi_rows.tolist(), row_idx.tolist(), oversold.tolist(),
+                          overbought.tolist(), sl.tolist(), tp.tolist(), init_cap)
+
+try:
+    # Kernels precompilados (ver _backtest_kernels_aot): evitan el JIT en el primer backtest
+    from backend.services.backtest_kernels import (
+        compute_indicators as _compute_indicators_aot,
+        rsi_strategy as _rsi_strategy_aot
+    )
+except ImportError:
+    _compute_indicators_aot = None
+    _rsi_strategy_aot = None
+
+if njit is not None:
+    # Sin fastmath: los indicadores traen NaN en las primeras velas y las comparaciones deben respetarlo.
+    # nogil: los backtests de compare_strategies corren en hilos en paralelo
+    compute_indicators = _compute_indicators_aot or njit(cache=True, nogil=True)(compute_indicators_loop)
+    rsi_strategy_kernel = _rsi_strategy_aot or njit(cache=True, nogil=True)(rsi_strategy_loop)
+    # La malla se reparte entre núcleos con prange (pycc no admite parallel, no hay versión AOT)
+    rsi_sweep_kernel = njit(cache=True, parallel=True)(rsi_sweep_loop)
+    trade_stats = njit(cache=True, fastmath=True)(trade_stats_loop)
+else:
+    compute_indicators = _compute_indicators_aot or compute_indicators_vectorized
+    rsi_strategy_kernel = _rsi_strategy_aot or rsi_strategy_lists
+    rsi_sweep_kernel = rsi_sweep_lists
+    trade_stats = trade_stats_lists
+
+def warm_up():
+    """Compilar los kernels al arrancar para que el primer backtest no pague el JIT"""
+    dummy = np.linspace(100.0, 101.0, 8)
+    compute_indicators(dummy, 3, 2, 4, 2, 3)
+    rsi_strategy_kernel(dummy, np.full(8, 50.0), 30.0, 70.0, 0.02, 0.04, 1000.0)
+    trade_stats(dummy, dummy)
+    one = np.ones(1)
+    rsi_sweep_kernel(dummy, np.full((1, 8), 50.0), np.zeros(1, dtype=np.int64),
+                     30.0 * one, 70.0 * one, 0.02 * one, 0.04 * one, 1000.0)
@@ -0,0 +1,35 @@
+"""
+Kernels de backtesting compilables por adelantado (AOT)
+
+Generar el módulo nativo ``backtest_kernels`` junto a este archivo con:
+
+    python -m backend.services._backtest_kernels_aot
+
+Requiere numba; si el módulo compilado no existe, el servicio de backtesting
+usa las versiones @njit o las de pandas/Python de ``_backtest_kernels``.
+"""
+
+import os
+
+from backend.services._backtest_kernels import compute_indicators_loop, rsi_strategy_loop
+
+# Nombre del módulo nativo generado y firmas exportadas de cada kernel
+AOT_MODULE_NAME = "backtest_kernels"
+COMPUTE_INDICATORS_SIGNATURE = "f8[:, :](f8[:], i8, i8, i8, i8, i8)"
+RSI_STRATEGY_SIGNATURE = (
+    "Tuple((i8[:], i8[:], f8[:], f8[:], f8[:], f8[:], i1[:], f8[:]))"
+    "(f8[:], f8[:], f8, f8, f8, f8, f8)"
+)
+
+def build(output_dir: str = None):
+    """Compilar ``backtest_kernels`` con numba.pycc"""
+    from numba.pycc import CC
+
+    cc = CC(AOT_MODULE_NAME)
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    cc.export("compute_indicators", COMPUTE_INDICATORS_SIGNATURE)(compute_indicators_loop)
+    cc.export("rsi_strategy", RSI_STRATEGY_SIGNATURE)(rsi_strategy_loop)
+    cc.compile()
+
+if __name__ == "__main__":
+    build()
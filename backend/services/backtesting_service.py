@@ -4,15 +4,92 @@ Servicio de backtesting para validar estrategias
 
 import asyncio
 import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 import json
 
+try:
+    import pyarrow  # noqa: F401  (motor parquet de pandas)
+except ImportError:  # pyarrow es opcional: la caché de datos históricos queda solo en memoria
+    pyarrow = None
+
 from backend.services.binance_service import BinanceService
+from backend.services._backtest_kernels import (
+    EXIT_BB_MIDDLE, EXIT_MA_CROSSOVER, EXIT_MACD_SIGNAL, EXIT_REASONS, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT,
+    IND_BB_MID, IND_BB_STD, IND_MACD, IND_MACD_SIGNAL, IND_RSI,
+    compute_indicators, rsi_strategy_kernel, rsi_sweep_kernel, trade_stats, warm_up as warm_up_kernels
+)
 from backend.core.config import settings
 
+# Intervalo de las velas usadas en backtesting y formato ISO de sus fechas en los trades
+HISTORICAL_INTERVAL = "1h"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Caché de datos históricos: entradas en memoria, TTL (segundos) de los rangos aún abiertos
+# y directorio de los parquet de rangos cerrados (no cambian y se reutilizan entre procesos)
+HISTORICAL_CACHE_SIZE = 32
+HISTORICAL_CACHE_TTL = 300.0
+HISTORICAL_CACHE_DIR = Path("data") / "historical"
+
+def _strategy_iter(close: np.ndarray, *series: np.ndarray):
+    """
+    Iterar (vela, precio, *valores) desde la segunda vela
+    
+    Recorre listas de floats nativos: mucho más barato que indexar arrays vela a vela.
+    """
+    return zip(range(1, close.size), close[1:].tolist(), *(values[1:].tolist() for values in series))
+
+@dataclass(slots=True)
+class BacktestTrades:
+    """Trades cerrados de un backtest como arrays paralelos (un elemento por trade)"""
+    entry_idx: np.ndarray
+    exit_idx: np.ndarray
+    entry_px: np.ndarray
+    exit_px: np.ndarray
+    qty: np.ndarray
+    pnl: np.ndarray
+    exit_reason: np.ndarray
+    
+    @classmethod
+    def allocate(cls, capacity: int) -> "BacktestTrades":
+        """Arrays con capacidad para `capacity` trades (nunca hay más trades que velas)"""
+        return cls(
+            np.empty(capacity, dtype=np.int64),
+            np.empty(capacity, dtype=np.int64),
+            np.empty(capacity, dtype=np.float64),
+            np.empty(capacity, dtype=np.float64),
+            np.empty(capacity, dtype=np.float64),
+            np.empty(capacity, dtype=np.float64),
+            np.empty(capacity, dtype=np.int8)
+        )
+    
+    def record(self, k: int, entry: int, exit_bar: int, entry_price: float, exit_price: float,
+               quantity: float, pnl: float, exit_reason: int):
+        """Escribir el trade `k`"""
+        self.entry_idx[k] = entry
+        self.exit_idx[k] = exit_bar
+        self.entry_px[k] = entry_price
+        self.exit_px[k] = exit_price
+        self.qty[k] = quantity
+        self.pnl[k] = pnl
+        self.exit_reason[k] = exit_reason
+    
+    def truncate(self, count: int) -> "BacktestTrades":
+        """Vista con los primeros `count` trades"""
+        return BacktestTrades(
+            self.entry_idx[:count], self.exit_idx[:count], self.entry_px[:count],
+            self.exit_px[:count], self.qty[:count], self.pnl[:count], self.exit_reason[:count]
+        )
+    
+    def __len__(self) -> int:
+        return self.entry_idx.size
+
 class BacktestingService:
     """
     Servicio para realizar backtesting de estrategias de trading
@@ -30,12 +107,19 @@ class BacktestingService:
         self.strategies = self._load_strategies()
         self.is_initialized = False
         
+        # (symbol, start, end, interval) -> (instante de carga, datos); un lock por símbolo
+        self._hist_cache: "OrderedDict[Tuple[str, str, str, str], Tuple[Optional[float], pd.DataFrame]]" = OrderedDict()
+        self._hist_locks: Dict[str, asyncio.Lock] = {}
+        
     async def initialize(self):
         """Inicializar el servicio de backtesting"""
         try:
             self.binance_service = BinanceService()
             await self.binance_service.initialize()
             
+            # Compilar los kernels antes del primer backtest
+            warm_up_kernels()
+            
             self.is_initialized = True
             self.logger.info("✅ Backtesting Service inicializado")
             
@@ -90,12 +174,14 @@ class BacktestingService:
             }
         }
     
-    async def run_backtest(self, backtest_params: Dict[str, Any]) -> Dict[str, Any]:
+    async def run_backtest(self, backtest_params: Dict[str, Any],
+                           df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """
         Ejecutar backtesting de una estrategia
         
         Args:
             backtest_params: Parámetros del backtest
+            df: Datos históricos ya cargados (si no se pasan, se descargan)
             
         Returns:
             Resultados del backtesting
@@ -115,17 +201,18 @@ class BacktestingService:
                 raise ValueError(f"Estrategia no encontrada: {strategy_name}")
             
             # Obtener datos históricos
-            df = await self._get_historical_data(symbol, start_date, end_date)
+            if df is None:
+                df = await self._get_historical_data(symbol, start_date, end_date)
             if df.empty:
                 raise ValueError(f"No se pudieron obtener datos históricos para {symbol}")
             
-            # Ejecutar estrategia
-            trades, equity_curve = await self._execute_strategy(
-                strategy_name, df, parameters, initial_capital
+            # Ejecutar estrategia en un hilo: los kernels liberan el GIL y el event loop sigue libre
+            trades, equity_curve = await asyncio.to_thread(
+                self._execute_strategy, strategy_name, df, parameters, initial_capital
             )
             
             # Calcular métricas
-            metrics = self._calculate_metrics(trades, equity_curve, initial_capital)
+            metrics = self._calculate_metrics(trades, equity_curve, initial_capital, df.index.values)
             
             # Preparar resultados
             result = {
@@ -135,11 +222,11 @@ class BacktestingService:
                 "start_date": start_date,
                 "end_date": end_date,
                 "initial_capital": initial_capital,
-                "final_capital": equity_curve[-1] if equity_curve else initial_capital,
+                "final_capital": float(equity_curve[-1]) if equity_curve.size else initial_capital,
                 "parameters": parameters,
                 "metrics": metrics,
-                "trades": trades,
-                "equity_curve": equity_curve,
+                "trades": self._build_trades(df.index, trades),
+                "equity_curve": equity_curve.tolist(),
                 "data_points": len(df),
                 "execution_time": datetime.utcnow().isoformat()
             }
@@ -158,17 +245,89 @@ class BacktestingService:
             }
     
     async def _get_historical_data(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
-        """Obtener datos históricos para backtesting"""
+        """
+        Obtener datos históricos para backtesting (con caché)
+        
+        Los rangos que ya terminaron se guardan sin expiración y en parquet;
+        los que incluyen la vela actual expiran tras HISTORICAL_CACHE_TTL.
+        """
+        key = (symbol, start_date, end_date, HISTORICAL_INTERVAL)
+        df = self._get_cached_history(key)
+        if df is not None:
+            return df
+        
+        # Una sola descarga por símbolo aunque lleguen varias peticiones a la vez
+        async with self._hist_locks.setdefault(symbol, asyncio.Lock()):
+            df = self._get_cached_history(key)
+            if df is not None:
+                return df
+            
+            closed = self._is_closed_range(end_date)
+            path = HISTORICAL_CACHE_DIR / f"{symbol}_{HISTORICAL_INTERVAL}_{start_date}_{end_date}.parquet"
+            
+            df = None
+            if closed and pyarrow is not None and path.exists():
+                try:
+                    df = await asyncio.to_thread(pd.read_parquet, path, engine="pyarrow")
+                except Exception as e:
+                    self.logger.warning(f"No se pudo leer la caché {path}: {e}")
+            
+            if df is None:
+                df = await self._download_historical_data(symbol, start_date, end_date)
+                if closed and pyarrow is not None and not df.empty:
+                    try:
+                        await asyncio.to_thread(self._write_history_parquet, df, path)
+                    except Exception as e:
+                        self.logger.warning(f"No se pudo guardar la caché {path}: {e}")
+            
+            if not df.empty:
+                self._hist_cache[key] = (None if closed else time.monotonic(), df)
+                while len(self._hist_cache) > HISTORICAL_CACHE_SIZE:
+                    self._hist_cache.popitem(last=False)
+            
+            return df
+    
+    def _get_cached_history(self, key: Tuple[str, str, str, str]) -> Optional[pd.DataFrame]:
+        """Datos en memoria para `key`, o None si no están o expiraron"""
+        entry = self._hist_cache.get(key)
+        if entry is None:
+            return None
+        loaded_at, df = entry
+        if loaded_at is not None and time.monotonic() - loaded_at > HISTORICAL_CACHE_TTL:
+            del self._hist_cache[key]
+            return None
+        self._hist_cache.move_to_end(key)
+        return df
+    
+    @staticmethod
+    def _is_closed_range(end_date: str) -> bool:
+        """True si la última vela del rango ya cerró (sus datos no van a cambiar)"""
+        try:
+            end_dt = pd.Timestamp(end_date)
+        except ValueError:
+            return False
+        return end_dt + timedelta(hours=1) <= datetime.utcnow()
+    
+    @staticmethod
+    def _write_history_parquet(df: pd.DataFrame, path: Path):
+        """Guardar datos históricos en parquet (escritura atómica vía archivo temporal)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+        tmp_path.replace(path)
+    
+    async def _download_historical_data(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """Descargar datos históricos de Binance"""
         try:
             # Calcular número de períodos necesarios
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+            start_dt = pd.Timestamp(start_date)
+            end_dt = pd.Timestamp(end_date)
             days_diff = (end_dt - start_dt).days
             
             # Usar intervalos de 1 hora para backtesting detallado
             periods = min(days_diff * 24, 1000)  # Máximo 1000 períodos
             
-            df = await self.binance_service.get_historical_data(symbol, "1h", periods)
+            df = await self.binance_service.get_historical_data(symbol, HISTORICAL_INTERVAL, periods)
             
             # Filtrar por fechas si es necesario
             if not df.empty:
@@ -180,346 +339,258 @@ class BacktestingService:
             self.logger.error(f"Error obteniendo datos históricos: {e}")
             return pd.DataFrame()
     
-    async def _execute_strategy(self, strategy_name: str, df: pd.DataFrame, 
-                              parameters: Dict[str, Any], initial_capital: float) -> Tuple[List[Dict], List[float]]:
+    def _execute_strategy(self, strategy_name: str, df: pd.DataFrame, 
+                        parameters: Dict[str, Any], initial_capital: float) -> Tuple[BacktestTrades, np.ndarray]:
         """Ejecutar estrategia en datos históricos"""
         try:
-            # Obtener parámetros con valores por defecto
-            strategy_config = self.strategies[strategy_name]
-            params = {}
-            for param_name, param_config in strategy_config["parameters"].items():
-                params[param_name] = parameters.get(param_name, param_config["default"])
+            params = self._resolve_params(strategy_name, parameters)
             
             # Ejecutar estrategia específica
             if strategy_name == "rsi_strategy":
-                return await self._execute_rsi_strategy(df, params, initial_capital)
+                return self._execute_rsi_strategy(df, params, initial_capital)
             elif strategy_name == "macd_strategy":
-                return await self._execute_macd_strategy(df, params, initial_capital)
+                return self._execute_macd_strategy(df, params, initial_capital)
             elif strategy_name == "ma_crossover":
-                return await self._execute_ma_crossover_strategy(df, params, initial_capital)
+                return self._execute_ma_crossover_strategy(df, params, initial_capital)
             elif strategy_name == "bollinger_bands":
-                return await self._execute_bollinger_strategy(df, params, initial_capital)
+                return self._execute_bollinger_strategy(df, params, initial_capital)
             else:
                 raise ValueError(f"Estrategia no implementada: {strategy_name}")
                 
         except Exception as e:
             self.logger.error(f"Error ejecutando estrategia {strategy_name}: {e}")
-            return [], [initial_capital]
+            return BacktestTrades.allocate(0), np.array([initial_capital], dtype=np.float64)
     
-    async def _execute_rsi_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
-                                  initial_capital: float) -> Tuple[List[Dict], List[float]]:
+    def _resolve_params(self, strategy_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Obtener parámetros con valores por defecto"""
+        strategy_config = self.strategies[strategy_name]
+        params = {}
+        for param_name, param_config in strategy_config["parameters"].items():
+            params[param_name] = parameters.get(param_name, param_config["default"])
+        return params
+    
+    def _execute_rsi_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
+                            initial_capital: float) -> Tuple[BacktestTrades, np.ndarray]:
         """Ejecutar estrategia RSI"""
-        import ta
+        close = df['close'].to_numpy(dtype=np.float64)
         
         # Calcular RSI
-        rsi = ta.momentum.RSIIndicator(df['close'], window=params['rsi_period']).rsi()
+        indicators = self._compute_indicators(close, rsi_period=params['rsi_period'])
         
-        trades = []
-        equity_curve = [initial_capital]
-        current_capital = initial_capital
-        position = None
+        *trade_arrays, equity_curve = rsi_strategy_kernel(
+            close,
+            indicators[:, IND_RSI],
+            float(params['oversold_level']),
+            float(params['overbought_level']),
+            float(params['stop_loss']),
+            float(params['take_profit']),
+            float(initial_capital)
+        )
         
-        for i in range(1, len(df)):
-            current_price = df['close'].iloc[i]
-            current_rsi = rsi.iloc[i]
-            timestamp = df.index[i]
-            
-            # Señal de compra (RSI oversold)
-            if position is None and current_rsi < params['oversold_level']:
-                # Abrir posición larga
-                quantity = current_capital * 0.95 / current_price  # 95% del capital
-                position = {
-                    'type': 'LONG',
-                    'entry_price': current_price,
-                    'entry_time': timestamp,
-                    'quantity': quantity,
-                    'stop_loss': current_price * (1 - params['stop_loss']),
-                    'take_profit': current_price * (1 + params['take_profit'])
-                }
-            
-            # Verificar salida de posición
-            elif position is not None:
-                exit_signal = False
-                exit_reason = ""
-                
-                # Señal de venta (RSI overbought)
-                if current_rsi > params['overbought_level']:
-                    exit_signal = True
-                    exit_reason = "RSI_OVERBOUGHT"
-                
-                # Stop loss
-                elif current_price <= position['stop_loss']:
-                    exit_signal = True
-                    exit_reason = "STOP_LOSS"
-                
-                # Take profit
-                elif current_price >= position['take_profit']:
-                    exit_signal = True
-                    exit_reason = "TAKE_PROFIT"
-                
-                if exit_signal:
-                    # Cerrar posición
-                    pnl = (current_price - position['entry_price']) * position['quantity']
-                    current_capital += pnl
-                    
-                    trade = {
-                        'entry_time': position['entry_time'].isoformat(),
-                        'exit_time': timestamp.isoformat(),
-                        'entry_price': position['entry_price'],
-                        'exit_price': current_price,
-                        'quantity': position['quantity'],
-                        'pnl': pnl,
-                        'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                        'exit_reason': exit_reason,
-                        'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                    }
-                    
-                    trades.append(trade)
-                    position = None
-            
-            equity_curve.append(current_capital)
+        return BacktestTrades(*trade_arrays), equity_curve
+    
+    def _compute_indicators(self, close: np.ndarray, rsi_period: int = 14, fast: int = 12,
+                            slow: int = 26, signal: int = 9, bb_period: int = 20) -> np.ndarray:
+        """Indicadores de todas las estrategias en una pasada (columnas IND_*)"""
+        return compute_indicators(close, int(rsi_period), int(fast), int(slow), int(signal), int(bb_period))
+    
+    def _build_trades(self, index: pd.DatetimeIndex, trades: BacktestTrades) -> List[Dict]:
+        """Convertir los trades en la lista de diccionarios del resultado JSON"""
+        entry_times = index[trades.entry_idx]
+        exit_times = index[trades.exit_idx]
+        durations = (exit_times - entry_times) / pd.Timedelta(hours=1)
+        pnl_pct = trades.pnl / (trades.entry_px * trades.qty) * 100
         
-        return trades, equity_curve
+        # Fechas formateadas y columnas convertidas en bloque; el bucle solo arma los diccionarios
+        return [
+            {
+                'entry_time': entry_time,
+                'exit_time': exit_time,
+                'entry_price': entry_price,
+                'exit_price': exit_price,
+                'quantity': quantity,
+                'pnl': pnl,
+                'pnl_pct': pct,
+                'exit_reason': EXIT_REASONS[reason],
+                'duration_hours': duration
+            }
+            for entry_time, exit_time, entry_price, exit_price, quantity, pnl, pct, reason, duration in zip(
+                entry_times.strftime(TIMESTAMP_FORMAT), exit_times.strftime(TIMESTAMP_FORMAT),
+                trades.entry_px.tolist(), trades.exit_px.tolist(), trades.qty.tolist(),
+                trades.pnl.tolist(), pnl_pct.tolist(), trades.exit_reason.tolist(), durations.tolist()
+            )
+        ]
     
-    async def _execute_macd_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
-                                   initial_capital: float) -> Tuple[List[Dict], List[float]]:
+    def _execute_macd_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
+                             initial_capital: float) -> Tuple[BacktestTrades, np.ndarray]:
         """Ejecutar estrategia MACD"""
-        import ta
+        close = df['close'].to_numpy(dtype=np.float64)
         
         # Calcular MACD
-        macd = ta.trend.MACD(
-            df['close'], 
-            window_fast=params['fast_period'],
-            window_slow=params['slow_period'],
-            window_sign=params['signal_period']
+        indicators = self._compute_indicators(
+            close,
+            fast=params['fast_period'],
+            slow=params['slow_period'],
+            signal=params['signal_period']
         )
+        diff = indicators[:, IND_MACD] - indicators[:, IND_MACD_SIGNAL]
+        n = close.size
         
-        macd_line = macd.macd()
-        macd_signal = macd.macd_signal()
+        # Cruces de MACD sobre/bajo la señal (NaN compara False, igual que vela a vela)
+        cross_up_idx = np.flatnonzero((diff[:-1] <= 0) & (diff[1:] > 0)) + 1
+        cross_dn_idx = np.flatnonzero((diff[:-1] >= 0) & (diff[1:] < 0)) + 1
         
-        trades = []
-        equity_curve = [initial_capital]
+        trades = BacktestTrades.allocate(n)
+        count = 0
+        equity = np.empty(n, dtype=np.float64)
         current_capital = initial_capital
-        position = None
+        last_exit = 0
+        i = 1
         
-        for i in range(1, len(df)):
-            current_price = df['close'].iloc[i]
-            current_macd = macd_line.iloc[i]
-            current_signal = macd_signal.iloc[i]
-            prev_macd = macd_line.iloc[i-1]
-            prev_signal = macd_signal.iloc[i-1]
-            timestamp = df.index[i]
-            
-            # Señal de compra (MACD cruza por encima de la señal)
-            if (position is None and 
-                prev_macd <= prev_signal and 
-                current_macd > current_signal):
-                
-                quantity = current_capital * 0.95 / current_price
-                position = {
-                    'type': 'LONG',
-                    'entry_price': current_price,
-                    'entry_time': timestamp,
-                    'quantity': quantity,
-                    'stop_loss': current_price * (1 - params['stop_loss']),
-                    'take_profit': current_price * (1 + params['take_profit'])
-                }
+        # Recorrer solo los eventos: entrada en cruce alcista, salida en cruce bajista o SL/TP
+        while True:
+            k = np.searchsorted(cross_up_idx, i)
+            if k == cross_up_idx.size:
+                break
+            entry = cross_up_idx[k]
+            entry_price = close[entry]
+            quantity = current_capital * 0.95 / entry_price
+            stop_loss = entry_price * (1 - params['stop_loss'])
+            take_profit = entry_price * (1 + params['take_profit'])
+            
+            j = np.searchsorted(cross_dn_idx, entry, side='right')
+            signal_exit = cross_dn_idx[j] if j < cross_dn_idx.size else n
+            
+            # Primera vela antes del cruce bajista que toca SL o TP (una pasada vectorizada)
+            window = close[entry + 1:signal_exit]
+            hit = (window <= stop_loss) | (window >= take_profit)
+            first = hit.argmax() if window.size else 0
+            
+            if window.size and hit[first]:
+                exit_bar = entry + 1 + first
+                reason = EXIT_STOP_LOSS if window[first] <= stop_loss else EXIT_TAKE_PROFIT
+            elif signal_exit < n:
+                exit_bar, reason = signal_exit, EXIT_MACD_SIGNAL
+            else:
+                break  # posición abierta al final de los datos
             
-            # Señal de venta (MACD cruza por debajo de la señal)
-            elif (position is not None and 
-                  prev_macd >= prev_signal and 
-                  current_macd < current_signal):
-                
-                pnl = (current_price - position['entry_price']) * position['quantity']
-                current_capital += pnl
-                
-                trade = {
-                    'entry_time': position['entry_time'].isoformat(),
-                    'exit_time': timestamp.isoformat(),
-                    'entry_price': position['entry_price'],
-                    'exit_price': current_price,
-                    'quantity': position['quantity'],
-                    'pnl': pnl,
-                    'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                    'exit_reason': "MACD_SIGNAL",
-                    'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                }
-                
-                trades.append(trade)
-                position = None
-            
-            # Verificar stop loss y take profit
-            elif position is not None:
-                if current_price <= position['stop_loss']:
-                    pnl = (current_price - position['entry_price']) * position['quantity']
-                    current_capital += pnl
-                    
-                    trade = {
-                        'entry_time': position['entry_time'].isoformat(),
-                        'exit_time': timestamp.isoformat(),
-                        'entry_price': position['entry_price'],
-                        'exit_price': current_price,
-                        'quantity': position['quantity'],
-                        'pnl': pnl,
-                        'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                        'exit_reason': "STOP_LOSS",
-                        'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                    }
-                    
-                    trades.append(trade)
-                    position = None
-                
-                elif current_price >= position['take_profit']:
-                    pnl = (current_price - position['entry_price']) * position['quantity']
-                    current_capital += pnl
-                    
-                    trade = {
-                        'entry_time': position['entry_time'].isoformat(),
-                        'exit_time': timestamp.isoformat(),
-                        'entry_price': position['entry_price'],
-                        'exit_price': current_price,
-                        'quantity': position['quantity'],
-                        'pnl': pnl,
-                        'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                        'exit_reason': "TAKE_PROFIT",
-                        'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                    }
-                    
-                    trades.append(trade)
-                    position = None
-            
-            equity_curve.append(current_capital)
+            exit_price = close[exit_bar]
+            trade_pnl = (exit_price - entry_price) * quantity
+            equity[last_exit:exit_bar] = current_capital
+            current_capital += trade_pnl
+            last_exit = exit_bar
+            
+            trades.record(count, entry, exit_bar, entry_price, exit_price, quantity, trade_pnl, reason)
+            count += 1
+            i = exit_bar + 1
         
-        return trades, equity_curve
+        equity[last_exit:] = current_capital
+        
+        return trades.truncate(count), equity
     
-    async def _execute_ma_crossover_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
-                                           initial_capital: float) -> Tuple[List[Dict], List[float]]:
+    def _execute_ma_crossover_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
+                                     initial_capital: float) -> Tuple[BacktestTrades, np.ndarray]:
         """Ejecutar estrategia de cruce de medias móviles"""
         # Calcular medias móviles
         fast_ma = df['close'].rolling(window=params['fast_ma']).mean()
         slow_ma = df['close'].rolling(window=params['slow_ma']).mean()
         
-        trades = []
-        equity_curve = [initial_capital]
+        close = df['close'].to_numpy(dtype=np.float64)
+        fast_arr = fast_ma.to_numpy(dtype=np.float64)
+        slow_arr = slow_ma.to_numpy(dtype=np.float64)
+        trades = BacktestTrades.allocate(len(df))
+        count = 0
+        equity_curve = np.empty(len(df), dtype=np.float64)
         current_capital = initial_capital
-        position = None
+        last_exit = 0
+        entry = -1  # vela de entrada de la posición abierta (-1: sin posición)
+        entry_price = 0.0
+        quantity = 0.0
+        prev_fast_ma = fast_arr[0]
+        prev_slow_ma = slow_arr[0]
         
-        for i in range(1, len(df)):
-            current_price = df['close'].iloc[i]
-            current_fast_ma = fast_ma.iloc[i]
-            current_slow_ma = slow_ma.iloc[i]
-            prev_fast_ma = fast_ma.iloc[i-1]
-            prev_slow_ma = slow_ma.iloc[i-1]
-            timestamp = df.index[i]
-            
+        for i, current_price, current_fast_ma, current_slow_ma in _strategy_iter(close, fast_arr, slow_arr):
             # Señal de compra (MA rápida cruza por encima de MA lenta)
-            if (position is None and 
+            if (entry < 0 and 
                 prev_fast_ma <= prev_slow_ma and 
                 current_fast_ma > current_slow_ma):
                 
+                entry = i
+                entry_price = current_price
                 quantity = current_capital * 0.95 / current_price
-                position = {
-                    'type': 'LONG',
-                    'entry_price': current_price,
-                    'entry_time': timestamp,
-                    'quantity': quantity,
-                    'stop_loss': current_price * (1 - params['stop_loss']),
-                    'take_profit': current_price * (1 + params['take_profit'])
-                }
             
             # Señal de venta (MA rápida cruza por debajo de MA lenta)
-            elif (position is not None and 
+            elif (entry >= 0 and 
                   prev_fast_ma >= prev_slow_ma and 
                   current_fast_ma < current_slow_ma):
                 
-                pnl = (current_price - position['entry_price']) * position['quantity']
+                pnl = (current_price - entry_price) * quantity
+                equity_curve[last_exit:i] = current_capital
                 current_capital += pnl
-                
-                trade = {
-                    'entry_time': position['entry_time'].isoformat(),
-                    'exit_time': timestamp.isoformat(),
-                    'entry_price': position['entry_price'],
-                    'exit_price': current_price,
-                    'quantity': position['quantity'],
-                    'pnl': pnl,
-                    'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                    'exit_reason': "MA_CROSSOVER",
-                    'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                }
-                
-                trades.append(trade)
-                position = None
+                last_exit = i
+                trades.record(count, entry, i, entry_price, current_price, quantity, pnl, EXIT_MA_CROSSOVER)
+                count += 1
+                entry = -1
             
-            equity_curve.append(current_capital)
+            prev_fast_ma = current_fast_ma
+            prev_slow_ma = current_slow_ma
+        
+        equity_curve[last_exit:] = current_capital
         
-        return trades, equity_curve
+        return trades.truncate(count), equity_curve
     
-    async def _execute_bollinger_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
-                                        initial_capital: float) -> Tuple[List[Dict], List[float]]:
+    def _execute_bollinger_strategy(self, df: pd.DataFrame, params: Dict[str, Any], 
+                                  initial_capital: float) -> Tuple[BacktestTrades, np.ndarray]:
         """Ejecutar estrategia Bollinger Bands"""
-        import ta
+        close = df['close'].to_numpy(dtype=np.float64)
         
         # Calcular Bollinger Bands
-        bb = ta.volatility.BollingerBands(
-            df['close'], 
-            window=params['period'],
-            window_dev=params['std_dev']
-        )
+        indicators = self._compute_indicators(close, bb_period=params['period'])
+        middle = indicators[:, IND_BB_MID]
+        lower = middle - params['std_dev'] * indicators[:, IND_BB_STD]
+        n = close.size
         
-        bb_upper = bb.bollinger_hband()
-        bb_lower = bb.bollinger_lband()
-        bb_middle = bb.bollinger_mavg()
+        # Velas de compra (precio toca banda inferior) y de venta (precio toca la media)
+        buy_idx = np.flatnonzero(close <= lower)
+        sell_idx = np.flatnonzero(close >= middle)
         
-        trades = []
-        equity_curve = [initial_capital]
+        trades = BacktestTrades.allocate(min(buy_idx.size, sell_idx.size))
+        count = 0
+        equity_curve = np.empty(n, dtype=np.float64)
         current_capital = initial_capital
-        position = None
+        last_exit = 0
+        i = 1
         
-        for i in range(1, len(df)):
-            current_price = df['close'].iloc[i]
-            current_upper = bb_upper.iloc[i]
-            current_lower = bb_lower.iloc[i]
-            current_middle = bb_middle.iloc[i]
-            timestamp = df.index[i]
-            
-            # Señal de compra (precio toca banda inferior)
-            if position is None and current_price <= current_lower:
-                quantity = current_capital * 0.95 / current_price
-                position = {
-                    'type': 'LONG',
-                    'entry_price': current_price,
-                    'entry_time': timestamp,
-                    'quantity': quantity,
-                    'stop_loss': current_price * (1 - params['stop_loss']),
-                    'take_profit': current_price * (1 + params['take_profit'])
-                }
-            
-            # Señal de venta (precio toca banda superior o media)
-            elif position is not None and current_price >= current_middle:
-                pnl = (current_price - position['entry_price']) * position['quantity']
-                current_capital += pnl
-                
-                trade = {
-                    'entry_time': position['entry_time'].isoformat(),
-                    'exit_time': timestamp.isoformat(),
-                    'entry_price': position['entry_price'],
-                    'exit_price': current_price,
-                    'quantity': position['quantity'],
-                    'pnl': pnl,
-                    'pnl_pct': (pnl / (position['entry_price'] * position['quantity'])) * 100,
-                    'exit_reason': "BB_MIDDLE",
-                    'duration_hours': (timestamp - position['entry_time']).total_seconds() / 3600
-                }
-                
-                trades.append(trade)
-                position = None
-            
-            equity_curve.append(current_capital)
+        # Saltar de evento en evento: O(#trades) iteraciones en lugar de O(#velas)
+        while True:
+            k = np.searchsorted(buy_idx, i)
+            if k == buy_idx.size:
+                break
+            entry = buy_idx[k]
+            
+            j = np.searchsorted(sell_idx, entry, side='right')
+            if j == sell_idx.size:
+                break  # posición abierta al final de los datos
+            exit_bar = sell_idx[j]
+            
+            entry_price = close[entry]
+            exit_price = close[exit_bar]
+            quantity = current_capital * 0.95 / entry_price
+            pnl = (exit_price - entry_price) * quantity
+            equity_curve[last_exit:exit_bar] = current_capital
+            current_capital += pnl
+            last_exit = exit_bar
+            
+            trades.record(count, entry, exit_bar, entry_price, exit_price, quantity, pnl, EXIT_BB_MIDDLE)
+            count += 1
+            i = exit_bar + 1
+        
+        equity_curve[last_exit:] = current_capital
         
-        return trades, equity_curve
+        return trades.truncate(count), equity_curve
     
-    def _calculate_metrics(self, trades: List[Dict], equity_curve: List[float], 
-                          initial_capital: float) -> Dict[str, Any]:
+    def _calculate_metrics(self, trades: BacktestTrades, equity_curve: np.ndarray, 
+                          initial_capital: float, timestamps: np.ndarray) -> Dict[str, Any]:
         """Calcular métricas de performance"""
         try:
             if not trades:
@@ -536,61 +607,52 @@ class BacktestingService:
                     "largest_loss": 0.0
                 }
             
-            # Métricas básicas
+            # Métricas básicas: una sola pasada sobre el PnL y la duración de los trades
             total_trades = len(trades)
-            winning_trades = [t for t in trades if t['pnl'] > 0]
-            losing_trades = [t for t in trades if t['pnl'] < 0]
+            durations = (timestamps[trades.exit_idx] - timestamps[trades.entry_idx]) / np.timedelta64(1, 'h')
+            (total_pnl, winning_trades, losing_trades, gross_profit, gross_loss,
+             largest_win, largest_loss, total_duration) = trade_stats(trades.pnl, durations)
             
-            total_pnl = sum(t['pnl'] for t in trades)
-            final_capital = equity_curve[-1] if equity_curve else initial_capital
+            final_capital = float(equity_curve[-1]) if equity_curve.size else initial_capital
             total_return_pct = ((final_capital - initial_capital) / initial_capital) * 100
             
-            win_rate = len(winning_trades) / total_trades if total_trades > 0 else 0
+            win_rate = winning_trades / total_trades
             
             # Profit factor
-            gross_profit = sum(t['pnl'] for t in winning_trades)
-            gross_loss = abs(sum(t['pnl'] for t in losing_trades))
             profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
             
             # Sharpe ratio (simplificado)
-            if len(equity_curve) > 1:
+            if equity_curve.size > 1:
                 returns = np.diff(equity_curve) / equity_curve[:-1]
                 sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if np.std(returns) > 0 else 0
             else:
                 sharpe_ratio = 0
             
             # Max drawdown
-            peak = equity_curve[0]
-            max_drawdown = 0
-            for value in equity_curve:
-                if value > peak:
-                    peak = value
-                drawdown = (peak - value) / peak
-                max_drawdown = max(max_drawdown, drawdown)
+            peaks = np.maximum.accumulate(equity_curve)
+            max_drawdown = float(((peaks - equity_curve) / peaks).max()) if equity_curve.size else 0.0
             
             # Otras métricas
-            average_trade = total_pnl / total_trades if total_trades > 0 else 0
-            largest_win = max([t['pnl'] for t in trades]) if trades else 0
-            largest_loss = min([t['pnl'] for t in trades]) if trades else 0
+            average_trade = total_pnl / total_trades
             
             return {
                 "total_trades": total_trades,
-                "winning_trades": len(winning_trades),
-                "losing_trades": len(losing_trades),
-                "total_return": total_pnl,
+                "winning_trades": int(winning_trades),
+                "losing_trades": int(losing_trades),
+                "total_return": float(total_pnl),
                 "total_return_pct": total_return_pct,
                 "win_rate": win_rate,
                 "profit_factor": profit_factor,
                 "sharpe_ratio": sharpe_ratio,
                 "max_drawdown": max_drawdown,
                 "average_trade": average_trade,
-                "average_win": np.mean([t['pnl'] for t in winning_trades]) if winning_trades else 0,
-                "average_loss": np.mean([t['pnl'] for t in losing_trades]) if losing_trades else 0,
-                "largest_win": largest_win,
-                "largest_loss": largest_loss,
+                "average_win": float(gross_profit / winning_trades) if winning_trades else 0,
+                "average_loss": float(-gross_loss / losing_trades) if losing_trades else 0,
+                "largest_win": float(largest_win),
+                "largest_loss": float(largest_loss),
                 "final_capital": final_capital,
-                "total_duration_hours": sum(t.get('duration_hours', 0) for t in trades),
-                "average_duration_hours": np.mean([t.get('duration_hours', 0) for t in trades]) if trades else 0
+                "total_duration_hours": float(total_duration),
+                "average_duration_hours": float(total_duration / total_trades)
             }
             
         except Exception as e:
@@ -609,17 +671,23 @@ class BacktestingService:
             start_date = comparison_params.get("start_date", "2023-01-01")
             end_date = comparison_params.get("end_date", "2024-01-01")
             
-            results = []
+            # Mismos datos para todas las estrategias: se descargan una sola vez
+            df = await self._get_historical_data(symbol, start_date, end_date)
             
-            for strategy_config in strategies:
-                backtest_result = await self.run_backtest({
+            backtest_results = await asyncio.gather(*(
+                self.run_backtest({
                     "strategy_name": strategy_config["name"],
                     "symbol": symbol,
                     "start_date": start_date,
                     "end_date": end_date,
                     "parameters": strategy_config.get("parameters", {})
-                })
-                
+                }, df=df)
+                for strategy_config in strategies
+            ))
+            
+            results = []
+            
+            for strategy_config, backtest_result in zip(strategies, backtest_results):
                 if backtest_result.get("success"):
                     results.append({
                         "strategy_name": strategy_config["name"],
@@ -656,4 +724,86 @@ class BacktestingService:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+    
+    async def run_batch_backtest(self, strategy_name: str, grid: List[Dict[str, Any]],
+                                 symbol: Optional[str] = None, start_date: str = "2023-01-01",
+                                 end_date: str = "2024-01-01",
+                                 initial_capital: float = 1000.0) -> List[Dict[str, Any]]:
+        """
+        Evaluar una estrategia sobre una malla de parámetros con una sola carga de datos
+        
+        La estrategia RSI se evalúa en un kernel paralelo sobre toda la malla (un RSI por
+        período distinto); las demás se ejecutan una tras otra sobre los mismos datos.
+        
+        Args:
+            strategy_name: Estrategia a evaluar
+            grid: Juegos de parámetros (los que falten toman el valor por defecto)
+            
+        Returns:
+            Un resultado resumido por juego de parámetros, en el orden de `grid`
+        """
+        symbol = symbol or settings.DEFAULT_TRADING_PAIR
+        try:
+            if strategy_name not in self.strategies:
+                raise ValueError(f"Estrategia no encontrada: {strategy_name}")
+            if not grid:
+                return []
+            
+            df = await self._get_historical_data(symbol, start_date, end_date)
+            if df.empty:
+                raise ValueError(f"No se pudieron obtener datos históricos para {symbol}")
+            
+            self.logger.info(f"🔄 Ejecutando {len(grid)} backtests de {strategy_name} en {symbol}")
+            return await asyncio.to_thread(self._run_batch, strategy_name, df, grid, initial_capital)
+            
+        except Exception as e:
+            self.logger.error(f"Error ejecutando backtest por lotes: {e}")
+            return [
+                {"success": False, "error": str(e), "strategy_name": strategy_name, "parameters": parameters}
+                for parameters in grid
+            ]
+    
+    def _run_batch(self, strategy_name: str, df: pd.DataFrame, grid: List[Dict[str, Any]],
+                   initial_capital: float) -> List[Dict[str, Any]]:
+        """Ejecutar la malla de parámetros (en un hilo, fuera del event loop)"""
+        params_list = [self._resolve_params(strategy_name, parameters) for parameters in grid]
+        
+        if strategy_name == "rsi_strategy":
+            close = df['close'].to_numpy(dtype=np.float64)
+            periods = np.array([int(params['rsi_period']) for params in params_list])
+            unique_periods, row_idx = np.unique(periods, return_inverse=True)
+            rsi_rows = np.stack([
+                self._compute_indicators(close, rsi_period=period)[:, IND_RSI] for period in unique_periods
+            ])
+            
+            def column(name: str) -> np.ndarray:
+                return np.array([float(params[name]) for params in params_list], dtype=np.float64)
+            
+            total_pnl, n_trades, final_equity = rsi_sweep_kernel(
+                close, rsi_rows, row_idx.astype(np.int64),
+                column('oversold_level'), column('overbought_level'),
+                column('stop_loss'), column('take_profit'),
+                float(initial_capital)
+            )
+            total_pnl, n_trades, final_equity = total_pnl.tolist(), n_trades.tolist(), final_equity.tolist()
+        else:
+            total_pnl, n_trades, final_equity = [], [], []
+            for params in params_list:
+                trades, equity_curve = self._execute_strategy(strategy_name, df, params, initial_capital)
+                total_pnl.append(float(trades.pnl.sum()))
+                n_trades.append(len(trades))
+                final_equity.append(float(equity_curve[-1]))
+        
+        return [
+            {
+                "success": True,
+                "strategy_name": strategy_name,
+                "parameters": parameters,
+                "total_trades": count,
+                "total_return": pnl,
+                "total_return_pct": (final - initial_capital) / initial_capital * 100,
+                "final_capital": final
+            }
+            for parameters, pnl, count, final in zip(grid, total_pnl, n_trades, final_equity)
+        ]
@@ -6,6 +6,7 @@ import asyncio
 import aiohttp
 import hmac
 import hashlib
+import json
 import time
 import logging
 from typing import Dict, Any, List, Optional
@@ -143,6 +144,37 @@ class BinanceService:
             self.logger.error(f"Error obteniendo precio de {symbol}: {e}")
             return await self._get_simulated_price(symbol)
     
+    async def get_current_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        Obtener precios actuales de varios símbolos en un solo request
+        
+        Args:
+            symbols: Símbolos a consultar (ej: ["BTCUSDT", "ETHUSDT"])
+            
+        Returns:
+            Diccionario símbolo -> precio
+        """
+        if not symbols:
+            return {}
+        
+        prices = {}
+        try:
+            result = await self._make_request(
+                'GET', '/api/v3/ticker/price',
+                {'symbols': json.dumps(list(symbols), separators=(',', ':'))}
+            )
+            if isinstance(result, list):
+                prices = {item['symbol']: float(item['price']) for item in result if 'price' in item}
+        except Exception as e:
+            self.logger.error(f"Error obteniendo precios de {len(symbols)} símbolos: {e}")
+        
+        # Fallback: usar datos simulados para los símbolos sin precio real
+        for symbol in symbols:
+            if symbol not in prices:
+                prices[symbol] = await self._get_simulated_price(symbol)
+        
+        return prices
+    
     async def _get_simulated_price(self, symbol: str) -> float:
         """Generar precio simulado para testing"""
         import random
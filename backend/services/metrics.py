@@ -0,0 +1,105 @@
+"""
+Métricas de performance de trading (Sharpe, drawdown, win rate, profit factor)
+"""
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba es opcional: el kernel corre como Python puro
+    njit = None
+
+# Capital inicial asumido para convertir PnL de trades en retornos
+DEFAULT_INITIAL_CAPITAL = 1000.0
+
+def _compute_perf(trade_pnls: np.ndarray, initial_capital: float):
+    """Recorrer los PnL de trades cerrados (en orden de cierre) acumulando todas las métricas"""
+    equity = initial_capital
+    peak = initial_capital
+    max_drawdown = 0.0
+    sum_r = 0.0
+    sum_r2 = 0.0
+    wins = 0
+    losses = 0
+    gross_win = 0.0
+    gross_loss = 0.0
+    largest_win = 0.0
+    largest_loss = 0.0
+
+    n = trade_pnls.size
+    for i in range(n):
+        pnl = trade_pnls[i]
+        r = pnl / equity if equity > 0 else 0.0
+        sum_r += r
+        sum_r2 += r * r
+
+        equity += pnl
+        if equity > peak:
+            peak = equity
+        drawdown = (peak - equity) / peak if peak > 0 else 0.0
+        if drawdown > max_drawdown:
+            max_drawdown = drawdown
+
+        if pnl > 0:
+            wins += 1
+            gross_win += pnl
+            if pnl > largest_win:
+                largest_win = pnl
+        elif pnl < 0:
+            losses += 1
+            gross_loss -= pnl
+            if pnl < largest_loss:
+                largest_loss = pnl
+
+    sharpe = 0.0
+    if n > 1:
+        mean = sum_r / n
+        variance = (sum_r2 - n * mean * mean) / (n - 1)
+        if variance > 0:
+            sharpe = mean / math.sqrt(variance)
+
+    return (equity - initial_capital, sharpe, max_drawdown, wins, losses,
+            gross_win, gross_loss, largest_win, largest_loss)
+
+if njit is not None:
+    _compute_perf = njit(cache=True, fastmath=True)(_compute_perf)
+
+def compute_performance(trade_pnls: np.ndarray, initial_capital: float = DEFAULT_INITIAL_CAPITAL) -> Dict[str, Optional[float]]:
+    """
+    Calcular métricas de performance a partir del PnL de trades cerrados
+
+    Args:
+        trade_pnls: PnL por trade, ordenado por fecha de cierre
+        initial_capital: Capital al inicio del período
+
+    Returns:
+        Diccionario con las métricas (mismas claves que el endpoint de performance)
+    """
+    trade_pnls = np.ascontiguousarray(trade_pnls, dtype=np.float64)
+    (total_pnl, sharpe, max_drawdown, wins, losses,
+     gross_win, gross_loss, largest_win, largest_loss) = _compute_perf(trade_pnls, initial_capital)
+
+    total_trades = int(trade_pnls.size)
+    return {
+        "total_return": float(total_pnl),
+        "total_return_pct": float(total_pnl / initial_capital * 100) if initial_capital > 0 else 0.0,
+        "sharpe_ratio": float(sharpe),
+        "max_drawdown": float(max_drawdown),
+        "win_rate": wins / total_trades if total_trades else 0.0,
+        # Sin pérdidas el profit factor no está definido (None; inf no es JSON válido)
+        "profit_factor": float(gross_win / gross_loss) if gross_loss > 0 else (None if gross_win > 0 else 0.0),
+        "total_trades": total_trades,
+        "winning_trades": int(wins),
+        "losing_trades": int(losses),
+        "average_win": float(gross_win / wins) if wins else 0.0,
+        "average_loss": float(-gross_loss / losses) if losses else 0.0,
+        "largest_win": float(largest_win),
+        "largest_loss": float(largest_loss),
+    }
+
+def warm_up():
+    """Compilar el kernel al arrancar para que la primera petición no pague el JIT"""
+    compute_performance(np.zeros(1))